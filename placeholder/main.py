@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import asyncio
+import json
 import logging
+import os
 import random
+from collections import defaultdict
 from datetime import datetime, timedelta
 
+import redis.asyncio as redis
+
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import (
     Application,
@@ -22,11 +28,166 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-# =============== «ПАМЯТЬ» МОК-ХРАНИЛИЩЕ ===============
-# (вместо Redis; просто для демонстрации)
-users = {}          # telegram_id -> внутренний ID (например, ФИО)
-availability = {}   # telegram_id -> список кортежей (start_datetime, end_datetime)
-last_schedule = {}  # telegram_id -> строка с последним расписанием
+# =============== ХРАНИЛИЩЕ В REDIS ===============
+REDIS_HOST = os.getenv('REDIS_HOST', 'redis')
+REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
+REDIS_DB = int(os.getenv('REDIS_DB', 0))
+REQUEST_STREAM = os.getenv('REDIS_REQUEST_STREAM', 'schedule:requests')
+RESULT_STREAM = os.getenv('REDIS_RESULT_STREAM', 'schedule:results')
+CONSUMER_GROUP = os.getenv('REDIS_CONSUMER_GROUP', 'bot_views')
+# Сколько хранить смены и сотрудников запроса до прихода его результата, секунды
+REQUEST_CONTEXT_TTL = int(os.getenv('REQUEST_CONTEXT_TTL', 7 * 86400))
+
+USERS_KEY = 'bot:users'                  # hash: telegram_id -> внутренний ID
+STAFF_KEY = 'bot:staff'                  # hash: внутренний ID -> telegram_id
+UNAVAILABLE_PREFIX = 'bot:unavailable:'  # zset на врача: "start:end" (unix-время), score = start
+SCHEDULE_PREFIX = 'bot:schedule:'        # string на врача: готовый текст расписания из schedule:results
+EMULATED_PREFIX = 'bot:emulated:'        # string на врача: текст эмуляции /reschedule
+REQUEST_PREFIX = 'bot:request:'          # string на запрос: смены и сотрудники в JSON
+
+
+def _interval(member: bytes):
+    start, end = member.split(b':')
+    return int(start), int(end)
+
+
+class Store:
+    """
+    Данные бота в Redis, переживают перезапуск.
+
+    Периоды недоступности врача лежат в sorted set, отсортированы по началу и при добавлении
+    сливаются с пересекающимися и соседними. Периоды не пересекаются, поэтому их концы тоже
+    отсортированы, и проверка пересечения с [start, end) — это один поиск предшественника
+    (ZREVRANGEBYSCORE ... LIMIT 0 1), O(log n) при любой длине истории.
+
+    Расписание врача хранится уже готовым текстом: оно собирается один раз, когда приходит
+    результат, и /my_schedule читает один ключ.
+    """
+
+    def __init__(self, client: redis.Redis):
+        self.redis = client
+
+    # --- Пользователи ---
+
+    async def register(self, telegram_id: int, internal_id: str) -> None:
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(USERS_KEY, telegram_id, internal_id)
+        pipe.hset(STAFF_KEY, internal_id, telegram_id)
+        await pipe.execute()
+
+    async def internal_id(self, telegram_id: int):
+        name = await self.redis.hget(USERS_KEY, telegram_id)
+        return name.decode() if name is not None else None
+
+    # --- Недоступность ---
+
+    async def add_unavailable(self, telegram_id: int, start: datetime, end: datetime) -> None:
+        """
+        Добавляет период [start, end), сливая его с пересекающимися и соседними периодами.
+        """
+        key = f"{UNAVAILABLE_PREFIX}{telegram_id}"
+        lo, hi = int(start.timestamp()), int(end.timestamp())
+
+        async def merge(pipe):
+            new_lo, new_hi = lo, hi
+            # Предшественник может заходить на новый период, остальные задетые начинаются внутри него
+            before = await pipe.zrevrangebyscore(key, lo, '-inf', start=0, num=1)
+            merged = set(await pipe.zrangebyscore(key, lo, hi))
+            if before and _interval(before[0])[1] >= lo:
+                merged.add(before[0])
+            for member in merged:
+                s, e = _interval(member)
+                new_lo, new_hi = min(new_lo, s), max(new_hi, e)
+            pipe.multi()
+            if merged:
+                pipe.zrem(key, *merged)
+            pipe.zadd(key, {f"{new_lo}:{new_hi}": new_lo})
+
+        await self.redis.transaction(merge, key)
+
+    async def busy_days(self, telegram_id: int, first_day: datetime, num_days: int = 7):
+        """
+        Для каждого из num_days дней с first_day: пересекается ли он с периодом недоступности.
+        Один запрос предшественника на день, все за один проход в Redis.
+        """
+        key = f"{UNAVAILABLE_PREFIX}{telegram_id}"
+        bounds = [(int((first_day + timedelta(days=i)).timestamp()),
+                   int((first_day + timedelta(days=i + 1)).timestamp())) for i in range(num_days)]
+        pipe = self.redis.pipeline(transaction=False)
+        for day_start, day_end in bounds:
+            pipe.zrevrangebyscore(key, f"({day_end}", '-inf', start=0, num=1)
+        found = await pipe.execute()
+        return [bool(members) and _interval(members[0])[1] > day_start
+                for (day_start, _), members in zip(bounds, found)]
+
+    # --- Расписание ---
+
+    async def save_emulated(self, telegram_id: int, text: str) -> None:
+        # Эмуляция /reschedule лежит отдельно и не затирает расписание от сервиса
+        await self.redis.set(f"{EMULATED_PREFIX}{telegram_id}", text)
+
+    async def schedule(self, telegram_id: int):
+        # Расписание от сервиса, а если его ещё нет — эмуляция; оба ключа одним MGET
+        real, emulated = await self.redis.mget(f"{SCHEDULE_PREFIX}{telegram_id}", f"{EMULATED_PREFIX}{telegram_id}")
+        text = real if real is not None else emulated
+        return text.decode() if text is not None else None
+
+    async def remember_request(self, request: dict) -> None:
+        """
+        Запоминает время смен, начало недели и telegram_id сотрудников запроса,
+        чтобы собрать тексты расписаний, когда придёт результат.
+        """
+        if not request.get('request_id'):
+            return
+        if 'staff' in request:
+            staff = {str(s['id']): s.get('telegram_id') for s in request['staff']}
+        else:
+            staff = {str(d): None for d in request.get('doctors', [])}
+        context = {
+            'week_start': request.get('week_start'),
+            'shifts': {str(s['shift_id']): [s['start'], s['end']] for s in request.get('shifts', [])
+                       if isinstance(s, dict)},
+            'staff': staff,
+        }
+        await self.redis.set(f"{REQUEST_PREFIX}{request['request_id']}", json.dumps(context),
+                             ex=REQUEST_CONTEXT_TTL)
+
+    async def publish_schedules(self, result: dict) -> int:
+        """
+        Собирает из итогового результата (успешного или запасного эвристического, status partial
+        с final) текст расписания каждого сотрудника запроса и записывает его по telegram_id.
+        Промежуточные решения (partial без final) пропускаются. Возвращает число обновлённых расписаний.
+        """
+        if not (result.get('status') == 'success' or (result.get('status') == 'partial' and result.get('final'))):
+            return 0
+        raw = await self.redis.get(f"{REQUEST_PREFIX}{result.get('request_id')}")
+        context = json.loads(raw) if raw is not None else {}
+
+        by_staff = defaultdict(list)
+        for a in result.get('assignments', []):
+            by_staff[str(a['staff_id'])].append(a)
+        staff = dict.fromkeys(by_staff)
+        staff.update(context.get('staff', {}))
+
+        # Сотрудники без telegram_id в запросе — через внутренний ID, указанный при /start
+        unknown = [sid for sid, tid in staff.items() if tid is None]
+        if unknown:
+            for sid, tid in zip(unknown, await self.redis.hmget(STAFF_KEY, unknown)):
+                staff[sid] = tid.decode() if tid is not None else None
+
+        pipe = self.redis.pipeline(transaction=False)
+        count = 0
+        for sid, tid in staff.items():
+            if tid is not None:
+                pipe.set(f"{SCHEDULE_PREFIX}{tid}", format_assignments(by_staff.get(sid, []), context))
+                count += 1
+        await pipe.execute()
+        if raw is not None:
+            await self.redis.delete(f"{REQUEST_PREFIX}{result.get('request_id')}")
+        return count
+
+
+store = Store(redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB))
 
 
 # =============== СТЕЙТЫ ДЛЯ ConversationHandler ===============
@@ -55,7 +216,7 @@ def parse_unavailable_period(text: str):
         return None
 
 
-def format_schedule_for_week(telegram_id: int, week_start: datetime) -> str:
+async def format_schedule_for_week(telegram_id: int, week_start: datetime) -> str:
     """
     Эмуляция генерации недельного расписания:
     - берём даты от week_start (понедельник) до следующего воскресенья
@@ -63,16 +224,10 @@ def format_schedule_for_week(telegram_id: int, week_start: datetime) -> str:
     - если попадает, отмечаем 'Недоступен'
     - иначе — присваиваем случайную смену (День/Ночь/Выходной)
     """
-    periods = availability.get(telegram_id, [])
+    busy_days = await store.busy_days(telegram_id, week_start)
     schedule_lines = []
-    for i in range(7):
+    for i, busy in enumerate(busy_days):
         day = week_start + timedelta(days=i)
-        busy = False
-        for (s, e) in periods:
-            if s.date() <= day.date() <= e.date():
-                busy = True
-                break
-
         day_name = day.strftime('%A %d.%m.%Y')
         if busy:
             schedule_lines.append(f"{day_name}: Недоступен")
@@ -87,6 +242,89 @@ def format_schedule_for_week(telegram_id: int, week_start: datetime) -> str:
     return header + "\n".join(schedule_lines)
 
 
+def format_assignments(assignments: list, context: dict) -> str:
+    """
+    Текст расписания одного врача по назначениям из schedule:results.
+    context — смены и начало недели из запроса (Store.remember_request); если запрос
+    не попался боту, вместо времени смены выводится её идентификатор.
+    """
+    week_start = datetime.fromisoformat(context['week_start']) if context.get('week_start') else None
+    shifts = context.get('shifts', {})
+    # Строки сортируются по ключу (группа, время или номер дня, смена): внутри группы типы одинаковые,
+    # поэтому даты и номера дней сравниваются как значения, а не как строки ("День 11" после "День 2")
+    lines = []
+    for a in assignments:
+        times = shifts.get(str(a.get('shift_id')))
+        if times is not None:
+            start, end = (datetime.fromisoformat(t) for t in times)
+            lines.append(((0, start, ''), f"{start.strftime('%A %d.%m.%Y')}: "
+                                          f"{start.strftime('%H:%M')}–{end.strftime('%H:%M')}"))
+        elif 'day' in a and week_start is not None:
+            day = week_start + timedelta(days=a['day'])
+            lines.append(((0, day, str(a['shift'])), f"{day.strftime('%A %d.%m.%Y')}: {a['shift']}"))
+        elif 'day' in a:
+            lines.append(((1, a['day'], str(a['shift'])), f"День {a['day'] + 1}: {a['shift']}"))
+        else:
+            lines.append(((2, 0, str(a.get('shift_id'))), f"Смена {a.get('shift_id')}"))
+    lines.sort(key=lambda line: line[0])
+
+    if week_start is not None:
+        header = (
+            f"Ваш план на неделю с {week_start.strftime('%d.%m.%Y')} "
+            f"по {(week_start + timedelta(days=6)).strftime('%d.%m.%Y')}:\n\n"
+        )
+    else:
+        header = "Ваше расписание:\n\n"
+    if not lines:
+        return header + "Смен нет."
+    return header + "\n".join(text for _, text in lines)
+
+
+async def watch_results(application: Application) -> None:
+    """
+    Фоновая задача: читает запросы и результаты сервиса расписаний в своей группе
+    потребителей и обновляет готовые тексты расписаний врачей.
+    """
+    consumer = f"bot-{os.getpid()}"
+    for stream in (REQUEST_STREAM, RESULT_STREAM):
+        try:
+            await store.redis.xgroup_create(stream, CONSUMER_GROUP, id='$', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    while True:
+        try:
+            entries = await store.redis.xreadgroup(
+                CONSUMER_GROUP, consumer, {REQUEST_STREAM: '>', RESULT_STREAM: '>'}, count=100, block=5000)
+        except redis.RedisError as e:
+            logger.warning(f"Ошибка чтения потоков: {e}")
+            await asyncio.sleep(5)
+            continue
+        # Запрос всегда записан раньше своего результата: запросы пачки обрабатываем первыми
+        for stream, messages in sorted(entries, key=lambda entry: entry[0].decode() != REQUEST_STREAM):
+            stream = stream.decode()
+            for message_id, fields in messages:
+                # Бинарные форматы (content-type msgpack) бот не разбирает
+                if fields.get(b'content-type', b'application/json') == b'application/json':
+                    try:
+                        payload = json.loads(fields.get(b'payload', b'{}'))
+                        if stream == REQUEST_STREAM:
+                            await store.remember_request(payload)
+                        else:
+                            updated = await store.publish_schedules(payload)
+                            if updated:
+                                logger.info(f"Результат {payload.get('request_id')}: "
+                                            f"расписаний обновлено {updated}")
+                    except (ValueError, KeyError, TypeError) as e:
+                        logger.warning(f"Не удалось разобрать {stream} {message_id}: {e}")
+                await store.redis.xack(stream, CONSUMER_GROUP, message_id)
+
+
+async def post_init(application: Application) -> None:
+    application.create_task(watch_results(application))
+
+
 # =============== ХЭНДЛЕРЫ ===============
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -95,7 +333,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     Иначе выдаём приветствие и список команд.
     """
     user_id = update.effective_user.id
-    if user_id not in users:
+    name = await store.internal_id(user_id)
+    if name is None:
         text = (
             "Добро пожаловать в систему планирования смен клиники «Здоровый Ребёнок».\n\n"
             "Похоже, вы ещё не привязаны к системе.\n"
@@ -106,7 +345,6 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         await update.message.reply_text(text)
         return AWAITING_INTERNAL_ID
     else:
-        name = users[user_id]
         keyboard = [
             [KeyboardButton('/unavailable'), KeyboardButton('/reschedule')],
             [KeyboardButton('/my_schedule')],
@@ -121,15 +359,12 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
 async def register_internal_id(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
-    Запоминаем «внутренний ID врача» (ФИО, номер), кладём в users[user_id].
-    Инициализируем пустые списки в availability и last_schedule.
+    Запоминаем «внутренний ID врача» (ФИО, номер) в Redis.
     """
     user_id = update.effective_user.id
     text = update.message.text.strip()
     # В реальной системе вы бы проверили в 1С, существует ли такой ID.
-    users[user_id] = text
-    availability[user_id] = []
-    last_schedule[user_id] = None
+    await store.register(user_id, text)
 
     await update.message.reply_text(
         f"Отлично, {text}! Ваш аккаунт привязан.\n\n"
@@ -167,7 +402,7 @@ async def unavailable_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
     Начало диалога /unavailable: просим врача ввести период недоступности.
     """
     user_id = update.effective_user.id
-    if user_id not in users:
+    if await store.internal_id(user_id) is None:
         await update.message.reply_text("Сначала выполните /start и привяжите свой аккаунт.")
         return ConversationHandler.END
 
@@ -182,7 +417,7 @@ async def unavailable_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 async def unavailable_receive(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
-    Получили строку от врача, парсим формат, сохраняем период в availability.
+    Получили строку от врача, парсим формат, сохраняем период в Redis.
     """
     user_id = update.effective_user.id
     text = update.message.text.strip()
@@ -194,8 +429,8 @@ async def unavailable_receive(update: Update, context: ContextTypes.DEFAULT_TYPE
         return AWAITING_UNAVAILABLE
 
     # Сохраняем период
-    availability[user_id].append(period)
     start_dt, end_dt = period
+    await store.add_unavailable(user_id, start_dt, end_dt)
     await update.message.reply_text(
         f"✅ Ваш период недоступности сохранён:\n"
         f"{start_dt.strftime('%d.%m.%Y %H:%M')} – {end_dt.strftime('%d.%m.%Y %H:%M')}\n\n"
@@ -212,7 +447,7 @@ async def reschedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Здесь эмулируем генерацию «настоящего» расписания.
     """
     user_id = update.effective_user.id
-    if user_id not in users:
+    if await store.internal_id(user_id) is None:
         await update.message.reply_text("Сначала выполните /start и привяжите свой аккаунт.")
         return
 
@@ -225,24 +460,23 @@ async def reschedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
     week_start = (now + timedelta(days=delta_days)).replace(hour=0, minute=0, second=0, microsecond=0)
 
     # Эмуляция расчёта – вместо реального OR-Tools
-    text_sched = format_schedule_for_week(user_id, week_start)
-    last_schedule[user_id] = text_sched
+    text_sched = await format_schedule_for_week(user_id, week_start)
+    await store.save_emulated(user_id, text_sched)
 
     await update.message.reply_text(text_sched)
 
 
 async def my_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
-    /my_schedule — просто отдаём сохранённый в last_schedule текст. 
+    /my_schedule — отдаём готовый текст расписания: он собран заранее, при получении
+    результата, так что это одно чтение из Redis. Пока результата нет — текст последнего /reschedule.
     Если ещё нет, просим выполнить /reschedule.
     """
     user_id = update.effective_user.id
-    if user_id not in users:
+    sched = await store.schedule(user_id)
+    if sched is None and await store.internal_id(user_id) is None:
         await update.message.reply_text("Сначала выполните /start и привяжите свой аккаунт.")
-        return
-
-    sched = last_schedule.get(user_id)
-    if not sched:
+    elif not sched:
         await update.message.reply_text(
             "У вас пока нет сформированного расписания.\n"
             "Введите /reschedule, чтобы пересчитать."
@@ -256,7 +490,7 @@ def main():
     TOKEN = "ВАШ_TELEGRAM_BOT_TOKEN"
 
     # ================= Создаём Application =================
-    application = Application.builder().token(TOKEN).build()
+    application = Application.builder().token(TOKEN).post_init(post_init).build()
 
     # ================= ConversationHandler для /start =================
     conv_start = ConversationHandler(
@@ -0,0 +1,420 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import redis
+import redis.asyncio as aioredis
+from cache import build_cache
+from capture import build_capture
+from codec import JSON, read_request, request_type, result_fields, result_type
+from lanes import LaneBacklog, job_lane
+from main import (MARK_LATEST_SCRIPT, Job, cacheable, init_worker, lookup_cached, run_job, schedule_scope,
+                  solver_budget, stream_id, superseded_result)
+from telemetry import observe_dispatch, observe_request, queue_lag, set_lane_depths, start_metrics_server
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRedisStreamClient:
+    """The stream operations of RedisStreamClient on redis.asyncio, sharing one connection pool."""
+
+    def __init__(self):
+        host = os.getenv('REDIS_HOST', 'redis')
+        port = int(os.getenv('REDIS_PORT', 6379))
+        db = int(os.getenv('REDIS_DB', 0))
+        self.request_stream = os.getenv('REDIS_REQUEST_STREAM', 'schedule:requests')
+        self.result_stream = os.getenv('REDIS_RESULT_STREAM', 'schedule:results')
+        self.group = os.getenv('REDIS_CONSUMER_GROUP', 'scheduler_service')
+        self.dead_letter_stream = os.getenv('REDIS_DEAD_LETTER_STREAM', 'schedule:dead-letter')
+        self.last_schedule_prefix = os.getenv('REDIS_LAST_SCHEDULE_PREFIX', 'schedule:last:')
+        self.latest_prefix = os.getenv('REDIS_LATEST_PREFIX', 'schedule:latest:')
+        self.latest_ttl = int(os.getenv('LATEST_TTL', 86400))
+        self.heartbeat_prefix = os.getenv('REDIS_HEARTBEAT_PREFIX', 'schedule:heartbeat:')
+        self.result_maxlen = int(os.getenv('RESULT_STREAM_MAXLEN', 10000)) or None
+        self.reclaim_idle_ms = int(os.getenv('RECLAIM_IDLE_MS', 300000))
+        self.max_deliveries = int(os.getenv('MAX_DELIVERIES', 3))
+        self._reclaim_cursor = '0-0'
+
+        pool = aioredis.ConnectionPool(host=host, port=port, db=db,
+                                       max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', 16)))
+        self.redis = aioredis.Redis(connection_pool=pool)
+        self._mark_latest = self.redis.register_script(MARK_LATEST_SCRIPT)
+        self.consumer = os.getenv('CONSUMER_NAME') or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+
+    async def create_group(self) -> None:
+        try:
+            await self.redis.xgroup_create(self.request_stream, self.group, id='0', mkstream=True)
+        except redis.exceptions.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def read_requests(self, block_ms: int, count: int) -> List[Tuple[bytes, Dict[bytes, bytes]]]:
+        resp = await self.redis.xreadgroup(
+            groupname=self.group,
+            consumername=self.consumer,
+            streams={self.request_stream: '>'},
+            count=count,
+            block=block_ms
+        ) or []
+        return [(message_id, fields) for _, entries in resp for message_id, fields in entries]
+
+    async def reclaim_pending(self, count: int, exclude: Set[bytes] = frozenset()) -> List[Tuple[bytes, Dict]]:
+        # Same policy as RedisStreamClient.reclaim_pending
+        next_id, claimed, *_ = await self.redis.xautoclaim(
+            self.request_stream, self.group, self.consumer,
+            min_idle_time=self.reclaim_idle_ms,
+            start_id=self._reclaim_cursor,
+            count=count,
+        )
+        self._reclaim_cursor = next_id
+        claimed = [(msg_id, fields) for msg_id, fields in claimed if msg_id not in exclude]
+        if not claimed:
+            return []
+
+        pipe = self.redis.pipeline(transaction=False)
+        for msg_id, _ in claimed:
+            pipe.xpending_range(self.request_stream, self.group, min=msg_id, max=msg_id, count=1)
+        deliveries = [entries[0]['times_delivered'] if entries else 0 for entries in await pipe.execute()]
+
+        result = []
+        pipe = self.redis.pipeline(transaction=True)
+        for (msg_id, fields), times_delivered in zip(claimed, deliveries):
+            if fields and times_delivered <= self.max_deliveries:
+                result.append((msg_id, fields))
+                continue
+            logger.warning(f"Dead-lettering request {msg_id} after {times_delivered} deliveries")
+            pipe.xadd(self.dead_letter_stream, {
+                **(fields or {}),
+                'original_id': msg_id,
+                'error': f'delivered {times_delivered} times without being acknowledged',
+            })
+            pipe.xack(self.request_stream, self.group, msg_id)
+        if len(pipe):
+            await pipe.execute()
+        return result
+
+    async def ack_request(self, message_id: bytes) -> None:
+        await self.redis.xack(self.request_stream, self.group, message_id)
+
+    async def publish_and_ack(self, message_id: bytes, result: Dict[str, Any], scope: Optional[str] = None,
+                              dead_letter: Optional[Dict[bytes, bytes]] = None, content_type: str = JSON) -> None:
+        pipe = self.redis.pipeline(transaction=True)
+        # Every result published here is the last one of its request; 'partial' alone also marks progress updates
+        fields = result_fields({**result, 'final': True}, content_type)
+        pipe.xadd(self.result_stream, fields, maxlen=self.result_maxlen, approximate=True)
+        if scope is not None:
+            pipe.set(self.last_schedule_prefix + scope, json.dumps(result['assignments']))
+        if dead_letter is not None:
+            pipe.xadd(self.dead_letter_stream, {**dead_letter, 'original_id': message_id, 'error': result['error']})
+        pipe.xack(self.request_stream, self.group, message_id)
+        await pipe.execute()
+
+    async def requeue(self, message_id: bytes, fields: Dict[bytes, bytes]) -> None:
+        # Hands a request back to the group right away instead of waiting for RECLAIM_IDLE_MS
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.xadd(self.request_stream, fields)
+        pipe.xack(self.request_stream, self.group, message_id)
+        await pipe.execute()
+
+    async def mark_latest(self, scope: str, message_id: bytes) -> Optional[bytes]:
+        return await self._mark_latest(keys=[self.latest_prefix + scope], args=[message_id, self.latest_ttl])
+
+    async def latest_requests(self, scopes: List[str]) -> List[Optional[bytes]]:
+        if not scopes:
+            return []
+        return await self.redis.mget([self.latest_prefix + scope for scope in scopes])
+
+    async def load_last_assignments(self, scope: str) -> Optional[List[Dict[str, Any]]]:
+        raw = await self.redis.get(self.last_schedule_prefix + scope)
+        return json.loads(raw) if raw is not None else None
+
+    async def heartbeat(self, status: Dict[str, Any], ttl: int) -> None:
+        await self.redis.set(self.heartbeat_prefix + self.consumer, json.dumps(status), ex=ttl)
+
+
+class AsyncScheduler:
+    """
+    Consumer loop of main() as concurrent asyncio tasks: reading, reclaiming, supervision and the
+    health endpoint keep running while solves execute in process pools.
+
+    At most jobs + fast-lane workers + READ_AHEAD requests are read and not yet acked; the reader
+    waits for that window to open instead of pulling more. On SIGTERM/SIGINT reading stops, waiting
+    requests are requeued, running solves get DRAIN_TIMEOUT seconds to finish and are then stopped
+    and requeued too.
+    """
+
+    def __init__(self):
+        self.client = AsyncRedisStreamClient()
+        # The result cache keeps its synchronous client and is used from a thread
+        self.cache = build_cache(redis.Redis(host=os.getenv('REDIS_HOST', 'redis'),
+                                             port=int(os.getenv('REDIS_PORT', 6379)),
+                                             db=int(os.getenv('REDIS_DB', 0))))
+        self.capture = build_capture()
+        self.jobs, self.fast_workers, self.max_workers = solver_budget()
+        self.read_ahead = int(os.getenv('READ_AHEAD', 4 * self.jobs))
+        self.read_count = int(os.getenv('READ_COUNT', 10))
+        self.block_ms = int(os.getenv('READ_BLOCK_MS', 1000))
+        self.reclaim_interval = float(os.getenv('RECLAIM_INTERVAL', 30))
+        self.supervise_interval = float(os.getenv('SUPERVISE_INTERVAL', 1))
+        self.drain_timeout = float(os.getenv('DRAIN_TIMEOUT', 30))
+        self.health_port = int(os.getenv('HEALTH_PORT', 8080))
+        self.warm_start = os.getenv('WARM_START', '0') == '1'
+        self.reconnect_delay = int(os.getenv('RECONNECT_DELAY', 5))
+
+        self.pool = ProcessPoolExecutor(max_workers=self.jobs, initializer=init_worker)
+        self.fast_pool = (ProcessPoolExecutor(max_workers=self.fast_workers, initializer=init_worker)
+                          if self.fast_workers else None)
+        self.manager = multiprocessing.Manager()
+
+        self.backlog = LaneBacklog()
+        self.in_flight: Dict[bytes, Job] = {}
+        self.tasks: Set[asyncio.Task] = set()
+        self.window = asyncio.Condition()
+        self.stopping = asyncio.Event()
+        self.started = time.time()
+
+    def capacity(self) -> int:
+        return self.jobs + self.fast_workers + self.read_ahead - len(self.in_flight) - len(self.backlog)
+
+    async def window_changed(self) -> None:
+        async with self.window:
+            self.window.notify_all()
+
+    async def forever(self, step, interval: float = 0.0) -> None:
+        # Runs step() until shutdown; Redis errors are logged and retried after RECONNECT_DELAY
+        while not self.stopping.is_set():
+            try:
+                await step()
+            except redis.exceptions.RedisError as e:
+                logger.exception(f"Redis error: {e}")
+                await self.sleep(self.reconnect_delay)
+                continue
+            if interval:
+                await self.sleep(interval)
+
+    async def read(self) -> None:
+        # Waits for room in the in-flight window before pulling more requests
+        async with self.window:
+            await self.window.wait_for(lambda: self.capacity() > 0 or self.stopping.is_set())
+        if not self.stopping.is_set():
+            await self.admit(await self.client.read_requests(self.block_ms, min(self.read_count, self.capacity())))
+
+    async def reclaim(self) -> None:
+        if self.capacity() > 0:
+            pending = set(self.in_flight) | {job.msg_id for job in self.backlog}
+            await self.admit(await self.client.reclaim_pending(min(self.read_count, self.capacity()), pending))
+
+    async def supervise(self) -> None:
+        # Cancels solves superseded on other consumers, exports lane depths and writes a heartbeat
+        jobs = [job for job in self.in_flight.values() if job.scope is not None and job.superseded_by is None]
+        for job, latest in zip(jobs, await self.client.latest_requests([job.scope for job in jobs])):
+            if latest is not None and stream_id(latest) > stream_id(job.msg_id):
+                logger.info(f"Cancelling request {job.msg_id}: superseded by {latest}")
+                job.superseded_by = latest
+                job.cancel.set()
+        set_lane_depths(self.backlog.depths())
+        await self.client.heartbeat(self.status(), max(1, int(3 * self.supervise_interval)))
+
+    async def sleep(self, seconds: float) -> None:
+        # Sleeps, but wakes up on shutdown
+        try:
+            await asyncio.wait_for(self.stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'consumer': self.client.consumer,
+            'stopping': self.stopping.is_set(),
+            'uptime': time.time() - self.started,
+            'in_flight': len(self.in_flight),
+            'backlog': self.backlog.depths(),
+        }
+
+    async def health(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # Minimal HTTP endpoint for liveness/readiness probes: 200 while serving, 503 while draining
+        await reader.readline()
+        body = json.dumps(self.status()).encode()
+        code = '503 Service Unavailable' if self.stopping.is_set() else '200 OK'
+        writer.write(f"HTTP/1.1 {code}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+        writer.close()
+
+    async def admit(self, messages: List[Tuple[bytes, Dict[bytes, bytes]]]) -> None:
+        # Same admission as main(): coalescing per scope, cache lookup, then the lane backlog
+        for msg_id, fields in messages:
+            payload = fields.get(b'payload')
+            if not payload:
+                await self.client.ack_request(msg_id)
+                continue
+            content_type = request_type(fields)
+            try:
+                request = read_request(payload, content_type)
+            except ValueError:
+                request = None
+            job = Job(msg_id, fields, payload, request, queue_lag=queue_lag(msg_id),
+                      content_type=content_type, accept=result_type(fields))
+            if request is not None:
+                job.scope = schedule_scope(request)
+
+            if job.scope is not None:
+                newer = await self.client.mark_latest(job.scope, msg_id)
+                if newer is not None:
+                    await self.publish_superseded(job, newer)
+                    continue
+                for older in [j for j in self.backlog if j.scope == job.scope]:
+                    self.backlog.remove(older)
+                    await self.publish_superseded(older, msg_id)
+                for running in self.in_flight.values():
+                    if running.scope == job.scope and running.superseded_by is None:
+                        logger.info(f"Cancelling request {running.msg_id}: superseded by {msg_id}")
+                        running.superseded_by = msg_id
+                        running.cancel.set()
+
+            job.cache_key, cached = await asyncio.to_thread(lookup_cached, self.cache, request)
+            if cached is not None:
+                start = time.perf_counter()
+                await self.client.publish_and_ack(msg_id, cached, scope=job.scope, content_type=job.accept)
+                observe_request(msg_id, cached, job.queue_lag, time.perf_counter() - start)
+                continue
+
+            job.lane = job_lane(request)
+            self.backlog.add(job)
+        self.dispatch_ready()
+
+    def dispatch_ready(self) -> None:
+        if self.stopping.is_set():
+            return
+        fast_busy = sum(1 for job in self.in_flight.values() if job.on_fast_pool)
+        while self.fast_pool is not None and fast_busy < self.fast_workers and self.backlog.has(('fast',)):
+            self.start(self.backlog.pop(('fast',)), on_fast_pool=True)
+            fast_busy += 1
+        while len(self.in_flight) - fast_busy < self.jobs and self.backlog:
+            self.start(self.backlog.pop())
+
+    def start(self, job: Job, on_fast_pool: bool = False) -> None:
+        job.on_fast_pool = on_fast_pool
+        job.cancel = self.manager.Event()
+        self.in_flight[job.msg_id] = job
+        task = asyncio.create_task(self.solve(job))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def solve(self, job: Job) -> None:
+        try:
+            latest = (await self.client.latest_requests([job.scope]))[0] if job.scope is not None else None
+            if latest is not None and stream_id(latest) > stream_id(job.msg_id):
+                await self.publish_superseded(job, latest)
+                return
+
+            previous = None
+            if job.scope is not None and job.request.get('warm_start', self.warm_start):
+                previous = await self.client.load_last_assignments(job.scope)
+            job.previous = previous
+            job.queue_lag = queue_lag(job.msg_id)
+            observe_dispatch(job.lane, job.queue_lag)
+            pool, workers = (self.fast_pool, 1) if job.on_fast_pool else (self.pool, self.max_workers)
+            loop = asyncio.get_running_loop()
+            try:
+                result = await loop.run_in_executor(pool, run_job, job.payload, workers, previous, job.cancel,
+                                                    job.content_type, job.accept)
+            except Exception as e:
+                logger.exception(f"Error processing request {job.msg_id}: {e}")
+                result = {'request_id': (job.request or {}).get('request_id'), 'status': 'error', 'error': str(e)}
+            await self.publish(job, result)
+        except redis.exceptions.RedisError as e:
+            # Left pending; another consumer (or this one) reclaims it after RECLAIM_IDLE_MS
+            logger.exception(f"Redis error while finishing request {job.msg_id}: {e}")
+        finally:
+            self.in_flight.pop(job.msg_id, None)
+            self.dispatch_ready()
+            await self.window_changed()
+
+    async def publish(self, job: Job, result: Dict[str, Any]) -> None:
+        # Mirrors publish_outcome(); requeued jobs were handed back during shutdown and publish nothing
+        if job.requeued:
+            return
+        start = time.perf_counter()
+        if result['status'] == 'error':
+            await self.client.publish_and_ack(job.msg_id, result, dead_letter=job.fields, content_type=job.accept)
+        elif result['status'] == 'superseded':
+            result = superseded_result(result.get('request_id'), job.superseded_by)
+            await self.client.publish_and_ack(job.msg_id, result, content_type=job.accept)
+        else:
+            if self.cache is not None and job.cache_key is not None and cacheable(result):
+                await asyncio.to_thread(self.cache.put, job.cache_key, result['assignments'])
+            start = time.perf_counter()
+            await self.client.publish_and_ack(job.msg_id, result, scope=job.scope, content_type=job.accept)
+        observe_request(job.msg_id, result, job.queue_lag, time.perf_counter() - start)
+        if self.capture is not None and result['status'] != 'superseded':
+            await asyncio.to_thread(self.capture.write, job.msg_id, job.fields, job.previous, result)
+
+    async def publish_superseded(self, job: Job, newer: bytes) -> None:
+        result = superseded_result((job.request or {}).get('request_id'), newer)
+        start = time.perf_counter()
+        await self.client.publish_and_ack(job.msg_id, result, content_type=job.accept)
+        observe_request(job.msg_id, result, job.queue_lag, time.perf_counter() - start)
+
+    async def drain(self) -> None:
+        # Requeue what has not started, give running solves DRAIN_TIMEOUT, then stop and requeue them
+        for job in list(self.backlog):
+            self.backlog.remove(job)
+            await self.client.requeue(job.msg_id, job.fields)
+        logger.info(f"Draining {len(self.in_flight)} running solves (up to {self.drain_timeout:g} s)")
+        if self.tasks:
+            await asyncio.wait(list(self.tasks), timeout=self.drain_timeout)
+        for job in list(self.in_flight.values()):
+            logger.info(f"Requeuing unfinished request {job.msg_id}")
+            job.requeued = True
+            job.cancel.set()
+            await self.client.requeue(job.msg_id, job.fields)
+        if self.tasks:
+            await asyncio.wait(list(self.tasks))
+
+    async def run(self) -> None:
+        await self.client.create_group()
+        start_metrics_server()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stopping.set)
+        health = None
+        if self.health_port:
+            health = await asyncio.start_server(self.health, port=self.health_port)
+        logger.info(f"Async scheduler started ({self.jobs} concurrent solves x up to {self.max_workers} CP-SAT "
+                    f"workers, {self.fast_workers} fast-lane workers), waiting for requests...")
+
+        workers = [
+            asyncio.create_task(self.forever(self.read)),
+            asyncio.create_task(self.forever(self.reclaim, self.reclaim_interval)),
+            asyncio.create_task(self.forever(self.supervise, self.supervise_interval)),
+        ]
+        await self.stopping.wait()
+        logger.info("Shutting down scheduler service.")
+        await self.window_changed()
+        # The reader returns after its current XREADGROUP; anything it read still goes to the backlog
+        await asyncio.gather(*workers, return_exceptions=True)
+        await self.drain()
+        if health is not None:
+            health.close()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        if self.fast_pool is not None:
+            self.fast_pool.shutdown(wait=True, cancel_futures=True)
+        self.manager.shutdown()
+        await self.client.redis.aclose()
+
+
+def main():
+    asyncio.run(AsyncScheduler().run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+# Synthetic workloads and benchmarks for the scheduler service; run with `python -m bench --help`
@@ -0,0 +1,73 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import time
+
+from bench.e2e import run_e2e
+from bench.model import run_model
+from bench.wire import run_wire
+from codec import CONTENT_TYPES, JSON
+
+logger = logging.getLogger('bench')
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m bench', description='Scheduler solver benchmarks')
+    parser.add_argument('mode', choices=['model', 'e2e', 'wire'],
+                        help='model: build/solve per synthetic instance; e2e: request latency under load; '
+                             'wire: payload size and parse time per content type')
+    parser.add_argument('--doctors', type=int, nargs='+', default=[20])
+    parser.add_argument('--days', type=int, nargs='+', default=[7])
+    parser.add_argument('--shifts', type=int, nargs='+', default=[3])
+    parser.add_argument('--density', type=float, nargs='+', default=[0.6], help='availability density')
+    parser.add_argument('--pref-density', type=float, nargs='+', default=[0.1], help='preference density')
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0])
+    parser.add_argument('--workers', type=int, default=8, help='CP-SAT workers per solve')
+    parser.add_argument('--time-limit', type=float, default=10.0, help='solve time limit, seconds')
+    parser.add_argument('--target', choices=['process', 'redis'], default='process',
+                        help='e2e: call process_request in a local pool, or go through Redis')
+    parser.add_argument('--rate', type=float, default=1.0, help='e2e: requests per second')
+    parser.add_argument('--requests', type=int, default=20, help='e2e: number of requests')
+    parser.add_argument('--jobs', type=int, default=1, help='e2e process target: concurrent solves')
+    parser.add_argument('--drain-timeout', type=float, default=300.0,
+                        help='e2e redis target: seconds to wait for results after the last request')
+    parser.add_argument('--content-type', choices=CONTENT_TYPES, default=JSON, help='e2e: request encoding')
+    parser.add_argument('--content-types', choices=CONTENT_TYPES, nargs='+',
+                        help='wire: content types to compare (default: all installed)')
+    parser.add_argument('--out', default='bench_results.json', help='JSON output file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    runners = {'model': run_model, 'e2e': run_e2e, 'wire': run_wire}
+    results = runners[args.mode](args)
+
+    from ortools import __version__ as ortools_version
+    report = {
+        'meta': {
+            'mode': args.mode,
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'ortools': ortools_version,
+            'cpus': os.cpu_count(),
+            'args': vars(args),
+        },
+        'results': results,
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Wrote {len(results)} results to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
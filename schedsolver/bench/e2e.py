@@ -0,0 +1,125 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple, Union
+
+from bench.workload import generate_problem
+from codec import read_result, request_fields
+from wire import encode_request
+
+logger = logging.getLogger('bench')
+
+
+def percentile(values: List[float], q: float) -> float:
+    # Nearest-rank percentile
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def make_payloads(args: Namespace) -> List[Tuple[str, Dict[str, Union[str, bytes]]]]:
+    # Request IDs and stream fields; distinct seeds so the result cache doesn't short-circuit the end-to-end run
+    payloads = []
+    for n in range(args.requests):
+        problem = generate_problem(args.doctors[0], args.days[0], args.shifts[0],
+                                   args.density[0], args.pref_density[0], seed=args.seeds[0] + n)
+        request = encode_request(problem)
+        request['request_id'] = str(uuid.uuid4())
+        request['time_limit'] = args.time_limit
+        payloads.append((request['request_id'], request_fields(request, args.content_type)))
+    return payloads
+
+
+def latency_summary(latencies: List[float], wall: float) -> Dict[str, Any]:
+    return {
+        'completed': len(latencies),
+        'throughput_rps': len(latencies) / wall if wall else None,
+        'latency_p50_s': percentile(latencies, 50),
+        'latency_p95_s': percentile(latencies, 95),
+        'latency_p99_s': percentile(latencies, 99),
+        'latency_max_s': max(latencies) if latencies else None,
+    }
+
+
+def run_e2e_process(args: Namespace, payloads: List[Tuple[str, Dict]]) -> Dict[str, Any]:
+    # Open-loop load: requests are submitted on schedule whether or not earlier ones finished
+    from main import process_request
+
+    latencies: List[float] = []
+    failures = 0
+    lock = threading.Lock()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        for n, (_, fields) in enumerate(payloads):
+            scheduled = start + n / args.rate
+            time.sleep(max(0.0, scheduled - time.perf_counter()))
+            future = pool.submit(process_request, fields['payload'], args.workers, content_type=args.content_type)
+
+            def record(done, scheduled=scheduled):
+                nonlocal failures
+                with lock:
+                    latencies.append(time.perf_counter() - scheduled)
+                    failures += done.exception() is not None
+            future.add_done_callback(record)
+    return {**latency_summary(latencies, time.perf_counter() - start), 'failed': failures}
+
+
+def run_e2e_redis(args: Namespace, payloads: List[Tuple[str, Dict]]) -> Dict[str, Any]:
+    # Drives a running consumer through a local Redis and waits for the final results
+    import redis
+
+    client = redis.Redis(host=os.getenv('REDIS_HOST', 'localhost'), port=int(os.getenv('REDIS_PORT', 6379)))
+    request_stream = os.getenv('REDIS_REQUEST_STREAM', 'schedule:requests')
+    result_stream = os.getenv('REDIS_RESULT_STREAM', 'schedule:results')
+    last_id = client.xinfo_stream(result_stream)['last-generated-id'] if client.exists(result_stream) else '0-0'
+
+    sent: Dict[str, float] = {}
+    latencies: List[float] = []
+    start = time.perf_counter()
+    deadline = None
+    pending = iter(enumerate(payloads))
+    next_item = next(pending, None)
+    while len(latencies) < len(payloads):
+        now = time.perf_counter()
+        while next_item is not None and start + next_item[0] / args.rate <= now:
+            n, (request_id, fields) = next_item
+            sent[request_id] = start + n / args.rate
+            client.xadd(request_stream, fields)
+            next_item = next(pending, None)
+            if next_item is None:
+                deadline = time.perf_counter() + args.drain_timeout
+        if deadline is not None and time.perf_counter() > deadline:
+            logger.warning(f"Timed out with {len(payloads) - len(latencies)} results missing")
+            break
+
+        for _, entries in client.xread({result_stream: last_id}, block=50, count=100) or []:
+            for entry_id, fields in entries:
+                last_id = entry_id
+                result = read_result(fields)
+                if result.get('final') and result.get('request_id') in sent:
+                    latencies.append(time.perf_counter() - sent.pop(result['request_id']))
+    return latency_summary(latencies, time.perf_counter() - start)
+
+
+def run_e2e(args: Namespace) -> List[Dict[str, Any]]:
+    payloads = make_payloads(args)
+    sizes = [len(fields['payload']) for _, fields in payloads]
+    run = run_e2e_redis if args.target == 'redis' else run_e2e_process
+    summary = run(args, payloads)
+    return [{
+        'target': args.target,
+        'rate_rps': args.rate,
+        'requests': len(payloads),
+        'jobs': args.jobs,
+        'content_type': args.content_type,
+        'num_workers': args.workers,
+        'payload_bytes_mean': sum(sizes) / len(sizes),
+        **summary,
+    }]
+
+
@@ -0,0 +1,73 @@
+import itertools
+import logging
+import multiprocessing
+import resource
+import time
+from argparse import Namespace
+from typing import Any, Dict, List
+
+from bench.workload import generate_problem
+from solver import build_model, solve_model
+
+logger = logging.getLogger('bench')
+
+
+def measure_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    # Runs in a fresh process so ru_maxrss is the peak of this case alone
+    problem = generate_problem(**case['workload'])
+
+    start = time.perf_counter()
+    model, x = build_model(**problem)
+    build_ms = (time.perf_counter() - start) * 1000
+    proto = model.Proto()
+
+    stats: Dict[str, Any] = {}
+    start = time.perf_counter()
+    try:
+        solve_model(model, x, num_workers=case['num_workers'], time_limit=case['time_limit'], stats=stats)
+    except ValueError:
+        pass
+    solve_ms = (time.perf_counter() - start) * 1000
+
+    objective, bound = stats.get('objective'), stats.get('best_bound')
+    gap = None
+    if objective is not None:
+        gap = abs(objective - bound) / max(1.0, abs(objective))
+    return {
+        **case,
+        'num_cells': len(x),
+        'num_variables': len(proto.variables),
+        'num_constraints': len(proto.constraints),
+        'build_ms': build_ms,
+        'solve_ms': solve_ms,
+        'status': stats.get('status'),
+        'objective': objective,
+        'best_bound': bound,
+        'gap': gap,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def run_model(args: Namespace) -> List[Dict[str, Any]]:
+    cases = [
+        {
+            'workload': {
+                'num_doctors': d, 'num_days': j, 'num_shifts': k,
+                'availability_density': a, 'preference_density': p, 'seed': seed,
+            },
+            'num_workers': args.workers,
+            'time_limit': args.time_limit,
+        }
+        for d, j, k, a, p, seed in itertools.product(
+            args.doctors, args.days, args.shifts, args.density, args.pref_density, args.seeds)
+    ]
+    results = []
+    # One process per case keeps peak RSS measurements independent
+    with multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+        for result in pool.imap(measure_case, cases):
+            logger.info(f"{result['workload']}: build {result['build_ms']:.1f} ms, "
+                        f"solve {result['solve_ms']:.1f} ms, {result['num_variables']} vars")
+            results.append(result)
+    return results
+
+
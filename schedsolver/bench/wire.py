@@ -0,0 +1,84 @@
+import itertools
+import logging
+import time
+from argparse import Namespace
+from typing import Any, Callable, Dict, List
+
+from bench.workload import generate_problem
+from codec import CONTENT_TYPES, JSON, read_request, read_result, request_fields, result_fields, supported
+from heuristic import greedy_schedule
+from wire import decode_request, encode_request
+
+logger = logging.getLogger('bench')
+
+# Repetitions per measurement; the fastest one is reported
+REPEAT = 5
+
+
+def best_ms(fn: Callable[[], Any]) -> float:
+    times = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def as_entry(fields: Dict[str, Any]) -> Dict[bytes, bytes]:
+    # Stream fields the way redis-py returns them
+    return {k.encode(): v.encode() if isinstance(v, str) else v for k, v in fields.items()}
+
+
+def measure_wire(workload: Dict[str, Any], content_types: List[str]) -> List[Dict[str, Any]]:
+    # Payload size and encode/decode time of one request and its result in every content type
+    problem = generate_problem(**workload)
+    request = encode_request(problem)
+    schedule = greedy_schedule(**problem, time_limit=0.0)
+    result = {
+        'request_id': 'bench',
+        'status': 'success',
+        'assignments': [{'staff_id': i, 'day': j, 'shift': k} for i, j, k in schedule],
+    }
+
+    rows = []
+    for content_type in content_types:
+        request_entry = as_entry(request_fields(request, content_type))
+        result_entry = as_entry(result_fields(result, content_type))
+        rows.append({
+            'workload': workload,
+            'content_type': content_type,
+            'num_cells': len(request['availability']),
+            'num_assignments': len(result['assignments']),
+            'request_bytes': len(request_entry[b'payload']),
+            'request_encode_ms': best_ms(lambda: request_fields(request, content_type)),
+            'request_decode_ms': best_ms(
+                lambda: decode_request(read_request(request_entry[b'payload'], content_type))),
+            'result_bytes': len(result_entry[b'payload']),
+            'result_encode_ms': best_ms(lambda: result_fields(result, content_type)),
+            'result_decode_ms': best_ms(lambda: read_result(result_entry)),
+        })
+
+    # Savings relative to JSON
+    baseline = next((row for row in rows if row['content_type'] == JSON), None)
+    for row in rows:
+        if baseline is not None:
+            for name in ('request_bytes', 'request_decode_ms', 'result_bytes', 'result_decode_ms'):
+                row[f'{name}_vs_json'] = row[name] / baseline[name] if baseline[name] else None
+    return rows
+
+
+def run_wire(args: Namespace) -> List[Dict[str, Any]]:
+    content_types = [t for t in args.content_types or CONTENT_TYPES if supported(t)]
+    results = []
+    for d, j, k, a, p, seed in itertools.product(
+            args.doctors, args.days, args.shifts, args.density, args.pref_density, args.seeds):
+        workload = {
+            'num_doctors': d, 'num_days': j, 'num_shifts': k,
+            'availability_density': a, 'preference_density': p, 'seed': seed,
+        }
+        for row in measure_wire(workload, content_types):
+            logger.info(f"{workload} {row['content_type']}: request {row['request_bytes']} B, "
+                        f"decode {row['request_decode_ms']:.2f} ms; result {row['result_bytes']} B, "
+                        f"decode {row['result_decode_ms']:.2f} ms")
+            results.append(row)
+    return results
@@ -0,0 +1,55 @@
+import random
+from typing import Any, Dict
+
+# Shift types in the order they are added as num_shifts grows: (name, duration in hours)
+SHIFT_TYPES = [('morning', 8), ('evening', 8), ('night', 12), ('day', 12), ('late', 6)]
+
+# Share of the staff's weekly hours the generated requirements ask for
+TARGET_LOAD = 0.7
+
+
+def generate_problem(num_doctors: int = 20, num_days: int = 7, num_shifts: int = 3,
+                     availability_density: float = 0.6, preference_density: float = 0.1,
+                     seed: int = 0) -> Dict[str, Any]:
+    """
+    Generates a seeded synthetic problem with the keyword arguments of generate_shift_schedule.
+
+    Requirements are sized so the staff covers about TARGET_LOAD of its capacity; availability and
+    preferences are independent per (doctor, day, shift) cell with the given densities.
+    """
+    rng = random.Random(seed)
+    doctors = list(range(num_doctors))
+    days = list(range(num_days))
+    shift_types = [SHIFT_TYPES[k] if k < len(SHIFT_TYPES) else (f'shift{k}', 8) for k in range(num_shifts)]
+    shifts = [name for name, _ in shift_types]
+    shift_durations = dict(shift_types)
+
+    max_weekly_hours = {i: rng.choice([32, 40, 48]) * num_days // 7 for i in doctors}
+    capacity = sum(max_weekly_hours.values()) * availability_density
+    mean_required = max(1, round(TARGET_LOAD * capacity / (num_days * sum(shift_durations.values()))))
+    requirements = {
+        (j, k): rng.randint(max(1, mean_required - 1), mean_required + 1)
+        for j in days for k in shifts
+    }
+
+    availability = {
+        (i, j, k): 1
+        for i in doctors for j in days for k in shifts
+        if rng.random() < availability_density
+    }
+    preferences = {
+        c: rng.randint(1, 3)
+        for c in availability
+        if rng.random() < preference_density
+    }
+
+    return {
+        'doctors': doctors,
+        'days': days,
+        'shifts': shifts,
+        'requirements': requirements,
+        'availability': availability,
+        'shift_durations': shift_durations,
+        'max_weekly_hours': max_weekly_hours,
+        'preferences': preferences,
+    }
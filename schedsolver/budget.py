@@ -0,0 +1,93 @@
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Union
+
+# Service-wide solver settings (see README)
+SOLVE_TIME_LIMIT = float(os.getenv('SOLVE_TIME_LIMIT', 60))
+RELATIVE_GAP = float(os.getenv('SOLVE_RELATIVE_GAP', 0))
+ABSOLUTE_GAP = float(os.getenv('SOLVE_ABSOLUTE_GAP', 0))
+STALL_SECONDS = float(os.getenv('SOLVE_STALL_SECONDS', 0))
+# CP-SAT seed (its own default is 1) and deterministic search, recorded with every solve for replay
+SOLVE_SEED = int(os.getenv('SOLVE_SEED', 1))
+SOLVE_DETERMINISTIC = os.getenv('SOLVE_DETERMINISTIC', '0') == '1'
+WEIGHTS = {
+    'alpha': int(os.getenv('WEIGHT_UNDERCOVERAGE', 1000)),
+    'beta': int(os.getenv('WEIGHT_DEVIATION', 5)),
+    'gamma': int(os.getenv('WEIGHT_PREFERENCE', 1)),
+}
+
+# Size classes by number of available (doctor, day, shift) cells: (name, max cells, time limit, workers)
+SIZE_CLASSES = [
+    ('small', 500, 5.0, 1),
+    ('medium', 5000, 20.0, 4),
+]
+
+# Time kept back from a deadline for extraction and publishing
+DEADLINE_MARGIN = 0.5
+MIN_TIME_LIMIT = 0.1
+
+
+def parse_deadline(deadline: Union[None, int, float, str]) -> Optional[float]:
+    # Deadlines are a unix timestamp or an ISO 8601 datetime
+    if deadline is None:
+        return None
+    if isinstance(deadline, (int, float)):
+        return float(deadline)
+    return datetime.fromisoformat(deadline).timestamp()
+
+
+def estimate_cells(request: Dict[str, Any]) -> Optional[int]:
+    # Available cells of a raw (not yet decoded) request, without building anything; None if unknown
+    if 'staff' in request:
+        # Interval format: upper bound before unavailability is applied
+        return len(request.get('staff') or []) * len(request.get('shifts') or [])
+    availability = request.get('availability')
+    if isinstance(availability, list):
+        return len(availability)
+    if isinstance(availability, dict):
+        return sum(1 for a in availability.values() if a)
+    return None
+
+
+def choose_budget(num_cells: int, max_workers: int, request: Dict[str, Any],
+                  now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Picks time limit, worker count and early-stop targets for one solve.
+
+    Small models get a single worker and a short limit, large ones the full SOLVE_TIME_LIMIT and
+    max_workers. A request 'deadline' shortens the limit; 'time_limit' (at most SOLVE_TIME_LIMIT),
+    'relative_gap', 'absolute_gap', 'stall_seconds', 'seed' and 'deterministic' override the service
+    defaults and 'num_workers' picks the worker count up to max_workers.
+    """
+    time_limit, workers, size_class = SOLVE_TIME_LIMIT, max_workers, 'large'
+    for name, max_cells, class_limit, class_workers in SIZE_CLASSES:
+        if num_cells <= max_cells:
+            size_class = name
+            time_limit, workers = min(SOLVE_TIME_LIMIT, class_limit), min(max_workers, class_workers)
+            break
+    # A request may shorten the limit but not exceed SOLVE_TIME_LIMIT
+    time_limit = min(SOLVE_TIME_LIMIT, float(request.get('time_limit', time_limit)))
+    if request.get('num_workers'):
+        workers = min(max_workers, int(request['num_workers']))
+
+    deadline = parse_deadline(request.get('deadline'))
+    deadline_bound = False
+    if deadline is not None:
+        remaining = deadline - (time.time() if now is None else now) - DEADLINE_MARGIN
+        if remaining < time_limit:
+            time_limit = max(MIN_TIME_LIMIT, remaining)
+            deadline_bound = True
+
+    return {
+        'size_class': size_class,
+        'num_cells': num_cells,
+        'time_limit': time_limit,
+        'num_workers': max(1, workers),
+        'deadline_bound': deadline_bound,
+        'relative_gap': float(request.get('relative_gap', RELATIVE_GAP)),
+        'absolute_gap': float(request.get('absolute_gap', ABSOLUTE_GAP)),
+        'stall_seconds': float(request.get('stall_seconds', STALL_SECONDS)),
+        'random_seed': int(request.get('seed', SOLVE_SEED)),
+        'deterministic': bool(request.get('deterministic', SOLVE_DETERMINISTIC)),
+    }
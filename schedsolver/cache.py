@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import redis
+from budget import WEIGHTS
+
+# Request fields that define the optimisation problem, with the defaults process_request applies
+SOLVER_INPUTS = {
+    'doctors': None,
+    'days': None,
+    'shifts': None,
+    'requirements': None,
+    'availability': None,
+    'shift_durations': None,
+    'max_weekly_hours': None,
+    'min_rest_hours': 11,
+    'preferences': None,
+    'slots': None,
+    'night_shifts': None,
+    'max_night_hours': None,
+    'slot_times': None,
+    'shift_starts': None,
+    'carry_hours': None,
+    'mode': None,   # fast (heuristic) answers are cached apart from CP-SAT ones
+    'format': None,   # interval requests get assignments with shift_id, expanded ones without
+    'alpha': WEIGHTS['alpha'],
+    'beta': WEIGHTS['beta'],
+    'gamma': WEIGHTS['gamma'],
+}
+
+
+def _canonical(value: Any) -> Any:
+    # Dicts become key-sorted pair lists so that key order and key type (tuple vs list) don't matter
+    if isinstance(value, dict):
+        pairs = [[_canonical(k), _canonical(v)] for k, v in value.items()]
+        return sorted(pairs, key=lambda kv: json.dumps(kv[0]))
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def request_key(request: Dict[str, Any]) -> str:
+    # Content hash of the solver inputs; envelope fields like request_id are ignored
+    inputs = {name: request.get(name, default) for name, default in SOLVER_INPUTS.items()}
+    # Sparse dicts: a zero entry means the same as a missing one
+    for name in ('availability', 'preferences'):
+        if inputs[name]:
+            inputs[name] = {k: v for k, v in inputs[name].items() if v}
+    blob = json.dumps(_canonical(inputs), separators=(',', ':'))
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+class InMemoryCache:
+    # Per-process LRU cache with TTL expiry
+    def __init__(self, max_size: int = 256, ttl: float = 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, assignments = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return assignments
+
+    def put(self, key: str, assignments: List[Dict[str, Any]]) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, assignments)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class RedisCache:
+    # Cache shared by all scheduler instances; Redis handles TTL expiry
+    def __init__(self, client: redis.Redis, ttl: float = 3600, prefix: str = 'schedule:cache:'):
+        self.redis = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        raw = self.redis.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def put(self, key: str, assignments: List[Dict[str, Any]]) -> None:
+        self.redis.set(self.prefix + key, json.dumps(assignments), ex=self.ttl)
+
+
+def build_cache(client: redis.Redis):
+    # RESULT_CACHE selects the backend: 'memory', 'redis' or 'off'
+    backend = os.getenv('RESULT_CACHE', 'memory')
+    ttl = float(os.getenv('RESULT_CACHE_TTL', 3600))
+    if backend == 'redis':
+        return RedisCache(client, ttl=ttl)
+    if backend == 'memory':
+        return InMemoryCache(max_size=int(os.getenv('RESULT_CACHE_SIZE', 256)), ttl=ttl)
+    return None
@@ -0,0 +1,81 @@
+import base64
+import gzip
+import json
+import logging
+import os
+import shutil
+import time
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from codec import JSON, request_type
+
+# Opt-in capture of solved requests for replay.py: one JSON line per request, rotated by size,
+# rotated files gzip-compressed (requests.jsonl, requests.jsonl.1.gz, ...)
+CAPTURE_PATH = os.getenv('CAPTURE_PATH')
+CAPTURE_MAX_BYTES = int(os.getenv('CAPTURE_MAX_BYTES', 100 * 2 ** 20))
+CAPTURE_BACKUPS = int(os.getenv('CAPTURE_BACKUPS', 5))
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+class CaptureLog:
+    """
+    Writes captured requests as JSON lines: the raw payload and its content type, the warm-start
+    schedule it was solved from, the effective solver parameters (budget: time limit, workers, gaps,
+    seed, determinism) and the result status and metrics. Assignments are not stored.
+    """
+
+    def __init__(self, path: str, max_bytes: int = CAPTURE_MAX_BYTES, backups: int = CAPTURE_BACKUPS):
+        self.path = path
+        self.handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+        self.handler.namer = lambda name: name + '.gz'
+        self.handler.rotator = _gzip_rotator
+        self.handler.setFormatter(logging.Formatter('%(message)s'))
+
+    def write(self, message_id: bytes, fields: Dict[bytes, bytes], previous: Optional[List[Dict[str, Any]]],
+              result: Dict[str, Any]) -> None:
+        payload = fields.get(b'payload', b'')
+        content_type = request_type(fields)
+        metrics = result.get('metrics') or {}
+        record = {
+            'captured_at': time.time(),
+            'message_id': message_id.decode(),
+            'request_id': result.get('request_id'),
+            'content_type': content_type,
+            'payload': payload.decode() if content_type == JSON else base64.b64encode(payload).decode(),
+            'previous': previous,
+            'parameters': metrics.get('budget'),
+            'status': result.get('status'),
+            'error': result.get('error'),
+            'metrics': metrics,
+        }
+        self.handler.handle(logging.makeLogRecord({'msg': json.dumps(record, default=str)}))
+
+    def close(self) -> None:
+        self.handler.close()
+
+
+def build_capture(path: Optional[str] = CAPTURE_PATH) -> Optional[CaptureLog]:
+    return CaptureLog(path) if path else None
+
+
+def captured_payload(record: Dict[str, Any]) -> Union[str, bytes]:
+    # Payload of a captured request, as it was read from the stream
+    if record['content_type'] == JSON:
+        return record['payload']
+    return base64.b64decode(record['payload'])
+
+
+def read_captures(paths: List[str]) -> Iterator[Dict[str, Any]]:
+    # Records of capture files, plain or gzip-compressed, in the given order
+    for path in paths:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
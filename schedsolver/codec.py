@@ -0,0 +1,201 @@
+import json
+import zlib
+from typing import Any, Dict, List, Tuple, Union
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # binary content types are optional
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Content types of the 'payload' stream field, named by the entry's 'content-type' field (JSON when absent).
+# The binary types pack availability and assignments as bitsets over the doctor x day x shift index:
+#   request availability: bytes, bit (i * len(days) + j) * len(shifts) + k set for available cells
+#   result assignments:   {'doctors': [...], 'days': [...], 'shifts': [...], 'bits': bytes, 'shift_id': bool}
+# A request may name the content type it wants results in with an 'accept' field.
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+MSGPACK_ZLIB = 'application/msgpack+zlib'
+MSGPACK_ZSTD = 'application/msgpack+zstd'
+CONTENT_TYPES = (JSON, MSGPACK, MSGPACK_ZLIB, MSGPACK_ZSTD)
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def supported(content_type: str) -> bool:
+    # Whether this install can read and write the content type
+    if content_type == JSON:
+        return True
+    if content_type in (MSGPACK, MSGPACK_ZLIB):
+        return msgpack is not None
+    if content_type == MSGPACK_ZSTD:
+        return msgpack is not None and zstandard is not None
+    return False
+
+
+def _field(fields: Dict[bytes, bytes], name: bytes) -> Union[str, None]:
+    value = fields.get(name)
+    return value.decode() if value else None
+
+
+def request_type(fields: Dict[bytes, bytes]) -> str:
+    # Content type of a request entry's payload
+    return _field(fields, b'content-type') or JSON
+
+
+def result_type(fields: Dict[bytes, bytes]) -> str:
+    # Content type to answer a request entry in: its 'accept' field, else its own type, else JSON
+    for content_type in (_field(fields, b'accept'), request_type(fields)):
+        if content_type is not None and supported(content_type):
+            return content_type
+    return JSON
+
+
+def dumps(obj: Any, content_type: str = JSON) -> Union[str, bytes]:
+    if content_type == JSON:
+        return json.dumps(obj)
+    if not supported(content_type):
+        raise ValueError(f"Unsupported content type {content_type!r}")
+    data = msgpack.packb(obj, use_bin_type=True)
+    if content_type == MSGPACK_ZLIB:
+        return zlib.compress(data, ZLIB_LEVEL)
+    if content_type == MSGPACK_ZSTD:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return data
+
+
+def loads(data: Union[str, bytes], content_type: str = JSON) -> Any:
+    # Every decoding failure surfaces as ValueError, like a malformed JSON payload
+    if content_type == JSON:
+        return json.loads(data)
+    if not supported(content_type):
+        raise ValueError(f"Unsupported content type {content_type!r}")
+    try:
+        if content_type == MSGPACK_ZLIB:
+            data = zlib.decompress(data)
+        elif content_type == MSGPACK_ZSTD:
+            data = zstandard.ZstdDecompressor().decompress(data)
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"Malformed {content_type} payload: {e}") from e
+
+
+def pack_cells(cells: List[Tuple], doctors: List, days: List, shifts: List) -> bytes:
+    # Bitset of (doc, day, shift) cells over the doctors x days x shifts index
+    num_days, num_shifts = len(days), len(shifts)
+    bits = np.zeros(len(doctors) * num_days * num_shifts, dtype=bool)
+    if cells:
+        doc_pos = {i: n for n, i in enumerate(doctors)}
+        day_pos = {j: n for n, j in enumerate(days)}
+        shift_pos = {k: n for n, k in enumerate(shifts)}
+        index = np.array([(doc_pos[i], day_pos[j], shift_pos[k]) for i, j, k in cells], dtype=np.int64)
+        bits[(index[:, 0] * num_days + index[:, 1]) * num_shifts + index[:, 2]] = True
+    return np.packbits(bits).tobytes()
+
+
+def unpack_cells(bits: bytes, doctors: List, days: List, shifts: List) -> List[Tuple]:
+    # Inverse of pack_cells; the bitset is read in place, without copying the payload
+    num_days, num_shifts = len(days), len(shifts)
+    count = len(doctors) * num_days * num_shifts
+    flat = np.flatnonzero(np.unpackbits(np.frombuffer(bits, dtype=np.uint8), count=count))
+    n, rest = np.divmod(flat, num_days * num_shifts)
+    j, k = np.divmod(rest, num_shifts)
+    return [(doctors[a], days[b], shifts[c]) for a, b, c in zip(n.tolist(), j.tolist(), k.tolist())]
+
+
+def pack_request(request: Dict[str, Any]) -> Dict[str, Any]:
+    # Availability of a request with doctors/days/shifts lists as a bitset; other formats are left as they are
+    availability = request.get('availability')
+    if 'staff' in request or not isinstance(availability, (list, dict)):
+        return request
+    if isinstance(availability, dict):
+        cells = [c for c, a in availability.items() if a]
+    else:
+        cells = [tuple(c) for c in availability]
+    packed = dict(request)
+    packed['availability'] = pack_cells(cells, request['doctors'], request['days'], request['shifts'])
+    return packed
+
+
+def unpack_request(request: Dict[str, Any]) -> Dict[str, Any]:
+    # Bitset availability back into the tuple-keyed dict decode_request accepts as-is
+    if not isinstance(request.get('availability'), bytes):
+        return request
+    unpacked = dict(request)
+    cells = unpack_cells(request['availability'], request['doctors'], request['days'], request['shifts'])
+    unpacked['availability'] = dict.fromkeys(cells, 1)
+    return unpacked
+
+
+def pack_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    # Assignments as a bitset over the doctors, days and shifts they mention
+    assignments = result.get('assignments')
+    if not isinstance(assignments, list):
+        return result
+    cells = [(a['staff_id'], a['day'], a['shift']) for a in assignments]
+    doctors, days, shifts = (list(dict.fromkeys(c[n] for c in cells)) for n in range(3))
+    packed = dict(result)
+    packed['assignments'] = {
+        'doctors': doctors,
+        'days': days,
+        'shifts': shifts,
+        'bits': pack_cells(cells, doctors, days, shifts),
+        'shift_id': any('shift_id' in a for a in assignments),
+    }
+    return packed
+
+
+def unpack_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    packed = result.get('assignments')
+    if not isinstance(packed, dict):
+        return result
+    cells = unpack_cells(packed['bits'], packed['doctors'], packed['days'], packed['shifts'])
+    unpacked = dict(result)
+    unpacked['assignments'] = [{'staff_id': i, 'day': j, 'shift': k} for i, j, k in cells]
+    if packed.get('shift_id'):
+        for a in unpacked['assignments']:
+            a['shift_id'] = a['shift']
+    return unpacked
+
+
+def request_fields(request: Dict[str, Any], content_type: str = JSON) -> Dict[str, Union[str, bytes]]:
+    # Stream fields of a wire-encoded request (see wire.encode_request)
+    if content_type == JSON:
+        return {'payload': dumps(request)}
+    return {'payload': dumps(pack_request(request), content_type), 'content-type': content_type}
+
+
+def read_request(payload: Union[str, bytes], content_type: str = JSON) -> Dict[str, Any]:
+    # Request payload into its wire encoding, bitsets already expanded
+    request = loads(payload, content_type)
+    if not isinstance(request, dict):
+        raise ValueError(f"Expected an object in the {content_type} payload")
+    if content_type == JSON:
+        return request
+    try:
+        return unpack_request(request)
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Malformed availability bitset: {e}") from e
+
+
+def result_fields(result: Dict[str, Any], content_type: str = JSON) -> Dict[str, Union[str, bytes]]:
+    # Stream fields of a result entry; JSON entries carry no content-type, as before
+    if content_type == JSON:
+        return {'payload': dumps(result)}
+    return {'payload': dumps(pack_result(result), content_type), 'content-type': content_type}
+
+
+def read_result(fields: Dict[bytes, bytes]) -> Dict[str, Any]:
+    # Result entry read from the results stream
+    content_type = request_type(fields)
+    result = loads(fields[b'payload'], content_type)
+    return result if content_type == JSON else unpack_result(result)
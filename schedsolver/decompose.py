@@ -0,0 +1,185 @@
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from heuristic import heuristic_start
+from solver import SEARCH_LOG_LINES, average_hours, generate_shift_schedule
+
+# Below this many available cells one model is cheaper than starting a pool
+DECOMPOSE_MIN_CELLS = int(os.getenv('DECOMPOSE_MIN_CELLS', 2000))
+
+
+class _DisjointSet:
+    def __init__(self):
+        self.parent: Dict[Hashable, Hashable] = {}
+
+    def find(self, node: Hashable) -> Hashable:
+        self.parent.setdefault(node, node)
+        root = node
+        while self.parent[root] != root:
+            root = self.parent[root]
+        # Path compression
+        while self.parent[node] != root:
+            self.parent[node], node = root, self.parent[node]
+        return root
+
+    def union(self, a: Hashable, b: Hashable) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[rb] = ra
+
+
+def find_components(doctors: List, slots: List[Tuple], availability: Dict[Tuple, int],
+                    partitions: Optional[List[List]] = None) -> List[Tuple[List, List[Tuple]]]:
+    """
+    Splits the problem into independent (doctors, slots) groups.
+
+    Doctors and (day, shift) slots are nodes of a bipartite graph with an edge per available cell;
+    every connected component can be solved on its own. Explicit partitions (lists of doctor IDs,
+    e.g. departments) keep their doctors together; partitions that share a slot are merged so the
+    decomposition stays exact. Slots nobody is available for are not part of any component.
+    """
+    dsu = _DisjointSet()
+    slot_set = set(slots)
+    for i in doctors:
+        dsu.find(('d', i))
+    for (i, j, k), a in availability.items():
+        if a and (j, k) in slot_set:
+            dsu.union(('d', i), ('s', (j, k)))
+    for group in partitions or []:
+        for i in group[1:]:
+            dsu.union(('d', group[0]), ('d', i))
+
+    components: Dict[Hashable, Tuple[List, List[Tuple]]] = {}
+    for i in doctors:
+        components.setdefault(dsu.find(('d', i)), ([], []))[0].append(i)
+    for slot in slots:
+        root = dsu.find(('s', slot))
+        if root in components:
+            components[root][1].append(slot)
+    return list(components.values())
+
+
+def _solve(heuristic_hint: bool = True, stats: Optional[Dict[str, Any]] = None, **kwargs) -> List[Tuple]:
+    # Without a previous schedule to warm start from, CP-SAT starts from a quick greedy schedule.
+    # Its local search is bounded by wall-clock time, so deterministic solves go without it
+    if heuristic_hint and kwargs.get('hint') is None and not kwargs.get('deterministic'):
+        start = time.perf_counter()
+        kwargs['initial'] = heuristic_start(**kwargs)
+        if stats is not None:
+            stats['heuristic_time'] = time.perf_counter() - start
+    return generate_shift_schedule(stats=stats, **kwargs)
+
+
+def _solve_component(kwargs: Dict[str, Any]) -> Tuple[List[Tuple], Dict[str, Any]]:
+    stats: Dict[str, Any] = {}
+    schedule = _solve(stats=stats, **kwargs)
+    return schedule, stats
+
+
+def merge_stats(parts: List[Dict[str, Any]], constant: float = 0, concurrency: Optional[int] = None) -> Dict[str, Any]:
+    # The objective is separable, so component objectives and bounds add up
+    merged = {
+        'status': 'OPTIMAL' if all(p['status'] == 'OPTIMAL' for p in parts) else 'FEASIBLE',
+        'num_incumbents': sum(p['num_incumbents'] for p in parts),
+        'objective': constant + sum(p['objective'] for p in parts),
+        'best_bound': constant + sum(p['best_bound'] for p in parts),
+    }
+    for key in ('num_variables', 'num_constraints', 'num_branches', 'num_conflicts',
+                'build_time', 'extract_time'):
+        merged[key] = sum(p[key] for p in parts)
+    if any('heuristic_time' in p for p in parts):
+        merged['heuristic_time'] = sum(p.get('heuristic_time', 0) for p in parts)
+    if any('search_log' in p for p in parts):
+        merged['search_log'] = [line for p in parts for line in p.get('search_log', [])][-SEARCH_LOG_LINES:]
+    # Components are solved concurrently, concurrency at a time
+    step = concurrency or len(parts)
+    merged['solve_time'] = sum(max(p['solve_time'] for p in parts[n:n + step]) for n in range(0, len(parts), step))
+    reasons = [p['stop_reason'] for p in parts if p['stop_reason'] != 'optimal']
+    merged['stop_reason'] = reasons[0] if reasons else 'optimal'
+    return merged
+
+
+def generate_decomposed_schedule(doctors, days, shifts, requirements, availability, shift_durations,
+                                 num_workers=8, partitions=None, decompose=True, stats=None, slots=None,
+                                 **kwargs):
+    """
+    Solves independent components of the problem concurrently and merges the result.
+
+    Takes the same arguments as generate_shift_schedule plus optional explicit partitions and
+    heuristic_hint (start CP-SAT from a greedy schedule when there is no warm-start hint and the
+    solve is not deterministic).
+    Small or connected problems, single-worker budgets and progressive solves (whose callback
+    cannot cross process boundaries) fall through to a single generate_shift_schedule call.
+    num_workers is split between the concurrently solved components; when there are more
+    components than workers, the time limit is split between the rounds.
+    """
+    if slots is None:
+        slots = [(j, k) for j in days for k in shifts]
+    num_cells = sum(1 for a in availability.values() if a)
+    components = []
+    if decompose and num_workers > 1 and num_cells >= DECOMPOSE_MIN_CELLS and kwargs.get('on_solution') is None:
+        components = find_components(doctors, slots, availability, partitions)
+    if len(components) < 2:
+        if stats is not None:
+            stats['num_components'] = 1
+        return _solve(doctors=doctors, days=days, shifts=shifts, requirements=requirements,
+                      availability=availability, shift_durations=shift_durations,
+                      num_workers=num_workers, stats=stats, slots=slots, **kwargs)
+
+    # Components share the global fairness target so the merged objective equals the monolithic one
+    h_avg = kwargs.pop('h_avg', None)
+    if h_avg is None:
+        h_avg = average_hours(doctors, slots, requirements, shift_durations, kwargs.get('carry_hours'))
+
+    # Slots nobody is available for are pure undercoverage
+    covered = {slot for _, comp_slots in components for slot in comp_slots}
+    uncovered_penalty = kwargs.get('alpha', 1000) * sum(requirements[s] for s in slots if s not in covered)
+
+    # Doctors without any available cell only contribute their fairness deviation; solve them together
+    idle = [i for comp_doctors, comp_slots in components if not comp_slots for i in comp_doctors]
+    components = [comp for comp in components if comp[1]]
+    if idle:
+        components.append((idle, []))
+
+    # Largest components first so the longest solves start immediately
+    components.sort(key=lambda comp: len(comp[0]) * len(comp[1]), reverse=True)
+    concurrency = min(len(components), num_workers)
+    # With more components than workers the pool solves them in rounds; each round gets its share
+    # of the time limit so the whole solve still ends within it
+    rounds = math.ceil(len(components) / concurrency)
+    kwargs['time_limit'] = kwargs.get('time_limit', 60) / rounds
+    jobs = []
+    for comp_doctors, comp_slots in components:
+        doctor_set = set(comp_doctors)
+        job = dict(kwargs)
+        # Per-doctor inputs are restricted to the component to keep the pickled jobs small
+        if job.get('preferences'):
+            job['preferences'] = {c: w for c, w in job['preferences'].items() if c[0] in doctor_set}
+        if job.get('hint') is not None:
+            job['hint'] = [c for c in job['hint'] if c[0] in doctor_set]
+        jobs.append(dict(
+            job,
+            doctors=comp_doctors,
+            days=days,
+            shifts=shifts,
+            requirements=requirements,
+            availability={c: a for c, a in availability.items() if a and c[0] in doctor_set},
+            shift_durations=shift_durations,
+            slots=comp_slots,
+            h_avg=h_avg,
+            num_workers=max(1, num_workers // concurrency),
+        ))
+
+    with ProcessPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(_solve_component, jobs))
+
+    schedule: List[Tuple] = []
+    for part, _ in results:
+        schedule.extend(part)
+    if stats is not None:
+        stats.update(merge_stats([part_stats for _, part_stats in results], uncovered_penalty, concurrency))
+        stats['num_components'] = len(components)
+    return schedule
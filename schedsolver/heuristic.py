@@ -0,0 +1,279 @@
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from solver import average_hours, conflict_cliques, slot_intervals
+
+# Seconds the heuristic may spend on local search (fast mode, fallback; a fraction of it for CP-SAT hints)
+HEURISTIC_TIME_LIMIT = float(os.getenv('HEURISTIC_TIME_LIMIT', 1.0))
+
+# Arguments of generate_shift_schedule that define the problem and are understood by greedy_schedule
+PROBLEM_ARGS = (
+    'doctors', 'days', 'shifts', 'requirements', 'availability', 'shift_durations', 'max_weekly_hours',
+    'min_rest_hours', 'preferences', 'alpha', 'beta', 'gamma', 'slots', 'h_avg', 'night_shifts',
+    'max_night_hours', 'slot_times', 'shift_starts', 'carry_hours',
+)
+
+
+class _Schedule:
+    """Incremental assignment state with O(1) objective deltas for adding and removing a doctor."""
+
+    def __init__(self, doctors, available, requirements, shift_durations, max_weekly_hours, h_avg, conflicts,
+                 night_set, max_night_hours, preferences, alpha, beta, gamma, carry_hours):
+        self.available = available
+        self.requirements = requirements
+        self.shift_durations = shift_durations
+        self.max_weekly_hours = max_weekly_hours
+        self.h_avg = h_avg
+        self.conflicts = conflicts
+        self.night_set = night_set
+        self.max_night_hours = max_night_hours
+        self.preferences = preferences
+        self.alpha, self.beta, self.gamma = alpha, beta, gamma
+        self.carry_hours = carry_hours   # counted toward fairness, not toward the hour limits
+        self.by_slot: Dict[Tuple, Set] = {slot: set() for slot in conflicts}
+        self.by_doctor: Dict[Any, Set[Tuple]] = {i: set() for i in doctors}
+        self.hours = {i: 0 for i in doctors}
+        self.night_hours = {i: 0 for i in doctors}
+
+    def missing(self, slot: Tuple) -> int:
+        return max(0, self.requirements[slot] - len(self.by_slot[slot]))
+
+    def can_take(self, i, slot: Tuple, ignore: Optional[Tuple] = None) -> bool:
+        # Hours, night hours and rest are checked as if `ignore` were already unassigned from i
+        t = self.shift_durations[slot[1]]
+        freed = self.shift_durations[ignore[1]] if ignore is not None else 0
+        if self.hours[i] - freed + t > self.max_weekly_hours[i]:
+            return False
+        if slot[1] in self.night_set and i in self.max_night_hours:
+            freed_night = freed if ignore is not None and ignore[1] in self.night_set else 0
+            if self.night_hours[i] - freed_night + t > self.max_night_hours[i]:
+                return False
+        taken = self.by_doctor[i]
+        return not any(other in taken and other != ignore for other in self.conflicts[slot])
+
+    def delta_add(self, i, slot: Tuple) -> float:
+        t = self.shift_durations[slot[1]]
+        h = self.hours[i]
+        cover = -self.alpha if self.missing(slot) else 0
+        h += self.carry_hours.get(i, 0)
+        fairness = self.beta * (abs(h + t - self.h_avg) - abs(h - self.h_avg))
+        return cover + fairness - self.gamma * self.preferences.get((i, *slot), 0)
+
+    def delta_remove(self, i, slot: Tuple) -> float:
+        t = self.shift_durations[slot[1]]
+        h = self.hours[i]
+        cover = self.alpha if len(self.by_slot[slot]) <= self.requirements[slot] else 0
+        h += self.carry_hours.get(i, 0)
+        fairness = self.beta * (abs(h - t - self.h_avg) - abs(h - self.h_avg))
+        return cover + fairness + self.gamma * self.preferences.get((i, *slot), 0)
+
+    def add(self, i, slot: Tuple) -> None:
+        t = self.shift_durations[slot[1]]
+        self.by_slot[slot].add(i)
+        self.by_doctor[i].add(slot)
+        self.hours[i] += t
+        if slot[1] in self.night_set:
+            self.night_hours[i] += t
+
+    def remove(self, i, slot: Tuple) -> None:
+        t = self.shift_durations[slot[1]]
+        self.by_slot[slot].discard(i)
+        self.by_doctor[i].discard(slot)
+        self.hours[i] -= t
+        if slot[1] in self.night_set:
+            self.night_hours[i] -= t
+
+    def objective(self) -> float:
+        undercoverage = sum(self.missing(slot) for slot in self.by_slot)
+        deviation = sum(abs(h + self.carry_hours.get(i, 0) - self.h_avg) for i, h in self.hours.items())
+        preference = sum(self.preferences.get((i, *slot), 0) for i, taken in self.by_doctor.items() for slot in taken)
+        return self.alpha * undercoverage + self.beta * deviation - self.gamma * preference
+
+
+def _best_replacement(state: _Schedule, candidates: List, slot: Tuple, exclude=()) -> Tuple[Optional[Any], float]:
+    best, best_delta = None, 0.0
+    for i in candidates:
+        if i in state.by_slot[slot] or i in exclude or not state.can_take(i, slot):
+            continue
+        delta = state.delta_add(i, slot)
+        if best is None or delta < best_delta:
+            best, best_delta = i, delta
+    return best, best_delta
+
+
+def _try_swap(state: _Schedule, candidates: List, i, slot: Tuple) -> bool:
+    # i hands `slot` to j and takes one of j's shifts in exchange; applied only if the objective drops
+    for j in candidates:
+        if j in state.by_slot[slot]:
+            continue
+        for other in list(state.by_doctor[j]):
+            if i in state.by_slot[other] or (i, *other) not in state.available:
+                continue
+            delta = state.delta_remove(i, slot)
+            state.remove(i, slot)
+            delta += state.delta_remove(j, other)
+            state.remove(j, other)
+            if state.can_take(j, slot) and state.can_take(i, other):
+                delta += state.delta_add(j, slot)
+                state.add(j, slot)
+                delta += state.delta_add(i, other)
+                if delta < 0:
+                    state.add(i, other)
+                    return True
+                state.remove(j, slot)
+            state.add(j, other)
+            state.add(i, slot)
+    return False
+
+
+def _improve(state: _Schedule, candidates: Dict[Tuple, List], rng: random.Random, deadline: float) -> None:
+    """
+    First-improvement local search: fill undercovered slots, hand shifts to better-suited doctors,
+    drop surplus assignments, swap shifts between two doctors and free a blocked doctor by moving
+    one conflicting shift to someone else.
+    """
+    slots = list(candidates)
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        rng.shuffle(slots)
+        for slot in slots:
+            if time.perf_counter() >= deadline:
+                return
+            # Add: fill a gap with the best feasible doctor
+            while state.missing(slot):
+                i, delta = _best_replacement(state, candidates[slot], slot)
+                if i is None or delta >= 0:
+                    break
+                state.add(i, slot)
+                improved = True
+
+            # Drop: surplus assignments that only worsen fairness or preferences
+            for i in list(state.by_slot[slot]):
+                if len(state.by_slot[slot]) > state.requirements[slot] and state.delta_remove(i, slot) < 0:
+                    state.remove(i, slot)
+                    improved = True
+
+            # Replace: move the shift to another doctor when that lowers the objective
+            for i in list(state.by_slot[slot]):
+                removed = state.delta_remove(i, slot)
+                state.remove(i, slot)
+                j, added = _best_replacement(state, candidates[slot], slot, exclude=(i,))
+                if j is not None and removed + added < 0:
+                    state.add(j, slot)
+                    improved = True
+                else:
+                    state.add(i, slot)
+
+            # Swap: two doctors exchange one shift each, which balances hours a single move overshoots
+            for i in list(state.by_slot[slot]):
+                if i in state.by_slot[slot] and _try_swap(state, candidates[slot], i, slot):
+                    improved = True
+
+            # Eject: a doctor blocked by one conflicting shift takes this slot, someone else takes the other
+            if state.missing(slot):
+                for i in candidates[slot]:
+                    if i in state.by_slot[slot]:
+                        continue
+                    blocking = [other for other in state.conflicts[slot] if other in state.by_doctor[i]]
+                    if len(blocking) != 1 or not state.can_take(i, slot, ignore=blocking[0]):
+                        continue
+                    other = blocking[0]
+                    delta = state.delta_remove(i, other)
+                    state.remove(i, other)
+                    delta += state.delta_add(i, slot)
+                    state.add(i, slot)
+                    j, added = _best_replacement(state, candidates[other], other, exclude=(i,))
+                    if j is not None and delta + added < 0:
+                        state.add(j, other)
+                        improved = True
+                        break
+                    state.remove(i, slot)
+                    state.add(i, other)
+
+
+def greedy_schedule(doctors, days, shifts,
+                    requirements,
+                    availability,
+                    shift_durations,
+                    max_weekly_hours,
+                    min_rest_hours=11,
+                    preferences=None,
+                    alpha=1000,
+                    beta=5,
+                    gamma=1,
+                    slots=None,
+                    h_avg=None,
+                    night_shifts=None,
+                    max_night_hours=None,
+                    slot_times=None,
+                    shift_starts=None,
+                    carry_hours=None,
+                    time_limit=HEURISTIC_TIME_LIMIT,
+                    seed=0,
+                    stats=None):
+    """
+    Builds a feasible schedule without CP-SAT: greedy coverage, scarcest slots first, then local search.
+
+    Takes the problem arguments of generate_shift_schedule and respects the same hard constraints
+    (availability, weekly and night hours, rest between shifts); coverage is best effort.
+
+    Args:
+        time_limit: Seconds for local search after the greedy pass.
+        seed: Seed of the local search move order.
+        stats: Optional dict filled with status 'HEURISTIC', objective, undercoverage and solve_time.
+
+    Returns:
+        schedule: List of the assigned (doc, day, shift) cells.
+    """
+    start = time.perf_counter()
+    if slots is None:
+        slots = [(j, k) for j in days for k in shifts]
+    if h_avg is None:
+        h_avg = average_hours(doctors, slots, requirements, shift_durations, carry_hours)
+
+    conflicts: Dict[Tuple, Set[Tuple]] = {slot: set() for slot in slots}
+    for clique in conflict_cliques(slot_intervals(slots, shift_durations, slot_times, shift_starts), min_rest_hours):
+        for slot in clique:
+            conflicts[slot].update(clique)
+    for slot, others in conflicts.items():
+        others.discard(slot)
+
+    doctor_set = set(doctors)
+    candidates: Dict[Tuple, List] = {slot: [] for slot in slots}
+    cells = []
+    for (i, j, k), a in availability.items():
+        if a and i in doctor_set and (j, k) in candidates:
+            candidates[(j, k)].append(i)
+            cells.append((i, j, k))
+
+    state = _Schedule(doctors, set(cells), requirements, shift_durations, max_weekly_hours, h_avg, conflicts,
+                      set(night_shifts or ()), max_night_hours or {}, preferences or {}, alpha, beta, gamma,
+                      carry_hours or {})
+
+    # Greedy: slots with the least slack first, longest shifts first among equals
+    order = sorted(slots, key=lambda s: (len(candidates[s]) - requirements[s], -shift_durations[s[1]]))
+    for slot in order:
+        feasible = [i for i in candidates[slot] if state.can_take(i, slot)]
+        feasible.sort(key=lambda i: state.delta_add(i, slot))
+        for i in feasible[:requirements[slot]]:
+            state.add(i, slot)
+
+    _improve(state, candidates, random.Random(seed), start + time_limit)
+
+    if stats is not None:
+        stats['status'] = 'HEURISTIC'
+        stats['stop_reason'] = 'heuristic'
+        stats['objective'] = state.objective()
+        stats['undercoverage'] = sum(state.missing(slot) for slot in slots)
+        stats['solve_time'] = time.perf_counter() - start
+    return [(i, *slot) for i, taken in state.by_doctor.items() for slot in taken]
+
+
+def heuristic_start(time_limit: float = 60, **problem) -> List[Tuple]:
+    # Assigned cells of a quick greedy schedule, used as a CP-SAT hint
+    budget = min(HEURISTIC_TIME_LIMIT, 0.1 * time_limit)
+    args = {name: problem[name] for name in PROBLEM_ARGS if name in problem}
+    return greedy_schedule(time_limit=budget, **args)
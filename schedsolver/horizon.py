@@ -0,0 +1,178 @@
+import os
+from typing import Any, Callable, Dict, Iterable, List, Set, Tuple
+
+from solver import SEARCH_LOG_LINES, conflict_cliques, slot_intervals
+
+# Days re-optimised per solve of a rolling-horizon request
+ROLLING_WINDOW_DAYS = int(os.getenv('ROLLING_WINDOW_DAYS', 7))
+
+# Weekly (and night) hour limits apply per block of WEEK_DAYS days, counted from day 0 of the horizon
+WEEK_DAYS = 7
+
+# Context cells further than this many days from a window cannot violate rest rules inside it
+REST_CONTEXT_DAYS = 2
+
+
+def horizon_windows(days: Iterable, window_days: int = ROLLING_WINDOW_DAYS) -> List[List]:
+    # Consecutive windows of at most window_days days; a window never spans two weeks
+    windows: List[List] = []
+    for day in sorted(days):
+        last = windows[-1] if windows else None
+        if last is None or len(last) >= window_days or last[0] // WEEK_DAYS != day // WEEK_DAYS:
+            windows.append([day])
+        else:
+            last.append(day)
+    return windows
+
+
+def _merge_stats(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # Windows are solved one after another, so times add up as well as objectives and counters
+    statuses = {p['status'] for p in parts}
+    merged: Dict[str, Any] = {'status': statuses.pop() if len(statuses) == 1 else 'FEASIBLE'}
+    for key in ('objective', 'best_bound', 'num_incumbents', 'num_variables', 'num_constraints', 'num_branches',
+                'num_conflicts', 'build_time', 'solve_time', 'extract_time', 'heuristic_time', 'undercoverage'):
+        if any(p.get(key) is not None for p in parts):
+            merged[key] = sum(p.get(key) or 0 for p in parts)
+    merged['num_components'] = sum(p.get('num_components', 1) for p in parts)
+    reasons = [p['stop_reason'] for p in parts if p.get('stop_reason') != 'optimal']
+    merged['stop_reason'] = reasons[0] if reasons else 'optimal'
+    if any('search_log' in p for p in parts):
+        merged['search_log'] = [line for p in parts for line in p.get('search_log', [])][-SEARCH_LOG_LINES:]
+    return merged
+
+
+def rolling_schedule(solve: Callable[..., List[Tuple]],
+                     doctors, days, shifts,
+                     requirements,
+                     availability,
+                     shift_durations,
+                     max_weekly_hours,
+                     min_rest_hours=11,
+                     preferences=None,
+                     slots=None,
+                     night_shifts=None,
+                     max_night_hours=None,
+                     slot_times=None,
+                     shift_starts=None,
+                     carry_hours=None,
+                     fixed=None,
+                     frozen_until=None,
+                     window_days=ROLLING_WINDOW_DAYS,
+                     changed_days=None,
+                     time_limit=60,
+                     hints=False,
+                     stats=None,
+                     **kwargs):
+    """
+    Plans a multi-week horizon one window of days at a time.
+
+    Days are counted from the start of the horizon; hour limits apply per week (days 0-6, 7-13, ...).
+    Cells of the published or worked schedule (`fixed`) on days before frozen_until never change.
+    Later days are split into windows (horizon_windows); a window is re-optimised when it has no
+    published cells yet, contains one of changed_days or one of its published cells is no longer
+    available, otherwise its published cells are kept. Every re-optimised window sees the rest of the
+    schedule as constants: hours of the same week reduce the weekly and night limits, all hours
+    outside the window join carry_hours in the fairness term, and doctors cannot take shifts that
+    break rest rules against a neighbouring fixed shift.
+
+    Args:
+        solve: Solver for one window, called with the problem arguments of generate_shift_schedule
+            plus time_limit and stats (generate_decomposed_schedule, greedy_schedule or a partial of them).
+        carry_hours: Optional dict doc -> hours worked before the horizon, for fairness.
+        fixed: Optional iterable of published or worked (doc, day, shift) cells.
+        frozen_until: First day that may change; defaults to the first day of the horizon.
+        window_days: Days per window.
+        changed_days: Optional days whose windows are re-optimised regardless of the published cells.
+        time_limit: Seconds for all re-optimised windows together, split evenly between them.
+        hints: Pass the published cells of a re-optimised window to solve as hint (CP-SAT solvers).
+        stats: Optional dict filled with the merged stats of the windows, num_windows and windows_solved.
+        **kwargs: Passed on to solve.
+
+    Returns:
+        schedule: List of the assigned (doc, day, shift) cells over the whole horizon.
+    """
+    if slots is None:
+        slots = [(j, k) for j in days for k in shifts]
+    if frozen_until is None:
+        frozen_until = min(days)
+    doctor_set = set(doctors)
+    night_set = set(night_shifts or ())
+    changed = set(changed_days or ())
+
+    plan: Dict[Any, Set[Tuple]] = {}   # day -> assigned cells
+    for c in fixed or ():
+        if c[0] in doctor_set:
+            plan.setdefault(c[1], set()).add(tuple(c))
+
+    windows = horizon_windows([j for j in days if j >= frozen_until], window_days)
+    stale = []
+    for window in windows:
+        cells = [c for j in window for c in plan.get(j, ())]
+        if not cells or changed.intersection(window) or not all(availability.get(c) for c in cells):
+            stale.append(window)
+
+    parts = []
+    for window in stale:
+        window_set = set(window)
+        week = window[0] // WEEK_DAYS
+        window_slots = [slot for slot in slots if slot[0] in window_set]
+        published = [c for j in window for c in plan.pop(j, ())]
+
+        # The rest of the schedule is constant while this window is solved
+        context = [c for cells in plan.values() for c in cells]
+        carry = dict(carry_hours or {})
+        week_hours: Dict[Any, int] = {}
+        week_night: Dict[Any, int] = {}
+        for i, j, k in context:
+            carry[i] = carry.get(i, 0) + shift_durations[k]
+            if j // WEEK_DAYS == week:
+                week_hours[i] = week_hours.get(i, 0) + shift_durations[k]
+                if k in night_set:
+                    week_night[i] = week_night.get(i, 0) + shift_durations[k]
+
+        # Cells that would break rest rules against a fixed shift of the same doctor
+        near = [c for c in context if window[0] - REST_CONTEXT_DAYS <= c[1] <= window[-1] + REST_CONTEXT_DAYS]
+        taken: Dict[Tuple, List] = {}
+        for i, j, k in near:
+            taken.setdefault((j, k), []).append(i)
+        blocked = set()
+        intervals = slot_intervals(window_slots + list(taken), shift_durations, slot_times, shift_starts)
+        for clique in conflict_cliques(intervals, min_rest_hours):
+            inside = [slot for slot in clique if slot[0] in window_set]
+            for slot in clique:
+                for i in taken.get(slot, ()):
+                    blocked.update((i, *other) for other in inside)
+
+        window_problem = dict(
+            kwargs,
+            doctors=doctors,
+            days=window,
+            shifts=shifts,
+            requirements=requirements,
+            availability={c: a for c, a in availability.items()
+                          if a and c[1] in window_set and c not in blocked},
+            shift_durations=shift_durations,
+            max_weekly_hours={i: max(0, max_weekly_hours[i] - week_hours.get(i, 0)) for i in doctors},
+            min_rest_hours=min_rest_hours,
+            preferences={c: w for c, w in (preferences or {}).items() if c[1] in window_set},
+            slots=window_slots,
+            night_shifts=night_shifts,
+            max_night_hours={i: max(0, h - week_night.get(i, 0)) for i, h in (max_night_hours or {}).items()},
+            slot_times=slot_times,
+            shift_starts=shift_starts,
+            carry_hours=carry,
+            time_limit=time_limit / len(stale),
+        )
+        if hints and published:
+            window_problem['hint'] = published
+        part: Dict[str, Any] = {}
+        for c in solve(stats=part, **window_problem):
+            plan.setdefault(c[1], set()).add(tuple(c))
+        parts.append(part)
+
+    if stats is not None:
+        if parts:
+            stats.update(_merge_stats(parts))
+        stats['num_windows'] = len(windows)
+        stats['windows_solved'] = len(stale)
+    return [c for j in sorted(plan) for c in sorted(plan[j], key=str)]
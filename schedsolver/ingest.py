@@ -0,0 +1,135 @@
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+import numpy as np
+
+DAY = timedelta(days=1)
+
+# Night time, local hours: a shift is a night shift when at least half of it falls between them
+NIGHT_START_HOUR = float(os.getenv('NIGHT_START_HOUR', 22))
+NIGHT_END_HOUR = float(os.getenv('NIGHT_END_HOUR', 6))
+
+
+def _timestamps(values: List[str]) -> np.ndarray:
+    return np.array([datetime.fromisoformat(v).timestamp() for v in values], dtype=np.float64)
+
+
+def unavailable_matrix(staff_ids: List, shift_starts: np.ndarray, shift_ends: np.ndarray,
+                       unavailability: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    Boolean staff x shift matrix, True where a shift overlaps one of the staff member's unavailability intervals.
+
+    Intervals of all staff are laid out on one axis, staff member n shifted by n * span, and sorted by
+    start. With the running maximum of interval ends, a shift [s, e) overlaps an interval of its staff
+    member iff the last interval starting before e ends after s — one searchsorted for all pairs.
+    """
+    num_staff, num_shifts = len(staff_ids), len(shift_starts)
+    row = {sid: n for n, sid in enumerate(staff_ids)}
+    entries = [u for u in unavailability if u['staff_id'] in row]
+    if not entries or not num_shifts:
+        return np.zeros((num_staff, num_shifts), dtype=bool)
+
+    rows = np.array([row[u['staff_id']] for u in entries], dtype=np.float64)
+    starts = _timestamps([u['from'] for u in entries])
+    ends = _timestamps([u['to'] for u in entries])
+
+    # Offset per staff member, larger than everything that happens within one member's range
+    origin = min(starts.min(), shift_starts.min())
+    span = max(ends.max(), shift_ends.max()) - origin + 1
+    starts = starts - origin + rows * span
+    ends = ends - origin + rows * span
+
+    order = np.argsort(starts, kind='stable')
+    starts, ends = starts[order], np.maximum.accumulate(ends[order])
+
+    offsets = (np.arange(num_staff, dtype=np.float64) * span)[:, None]
+    query_starts = shift_starts[None, :] - origin + offsets
+    query_ends = shift_ends[None, :] - origin + offsets
+    last = np.searchsorted(starts, query_ends, side='left') - 1
+    return (last >= 0) & (ends[np.maximum(last, 0)] > query_starts)
+
+
+def night_hours(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    Hours of each shift [start, end) inside night time; start and end in hours since a local midnight.
+
+    One vectorised overlap per night window the shifts can touch: NIGHT_START_HOUR of day d to
+    NIGHT_END_HOUR of day d + 1.
+    """
+    night = np.zeros(len(starts))
+    if not len(starts):
+        return night
+    length = (NIGHT_END_HOUR - NIGHT_START_HOUR) % 24
+    for d in range(int(np.floor(starts.min() / 24)) - 1, int(np.ceil(ends.max() / 24)) + 1):
+        window_start = d * 24 + NIGHT_START_HOUR
+        night += np.clip(np.minimum(ends, window_start + length) - np.maximum(starts, window_start), 0, None)
+    return night
+
+
+def from_interval_request(request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Translates a request in the README format (staff, unavailability, shifts with ISO start/end)
+    into the inputs of generate_shift_schedule.
+
+    Every shift becomes its own slot (day, shift_id) with the day counted from week_start; durations
+    are rounded to whole hours, a shift is a night shift when at least half of it falls in night time
+    (NIGHT_START_HOUR to NIGHT_END_HOUR; an explicit is_night overrides) and slot_times keep the exact
+    start/end in hours since week_start for the rest constraints. A shift's preference applies to
+    every staff member available for it.
+    """
+    staff = request['staff']
+    shifts = request['shifts']
+    staff_ids = [s['id'] for s in staff]
+
+    shift_starts = _timestamps([s['start'] for s in shifts])
+    shift_ends = _timestamps([s['end'] for s in shifts])
+    if 'week_start' in request:
+        week_start = datetime.fromisoformat(request['week_start'])
+    else:
+        week_start = datetime.fromtimestamp(shift_starts.min()).replace(hour=0, minute=0, second=0, microsecond=0)
+    origin = week_start.timestamp()
+    days_of = np.floor((shift_starts - origin) / DAY.total_seconds()).astype(int)
+
+    shift_ids = [s['shift_id'] for s in shifts]
+    slots = [(int(j), k) for j, k in zip(days_of, shift_ids)]
+    durations = np.rint((shift_ends - shift_starts) / 3600).astype(int)
+
+    hours_from = (shift_starts - origin) / 3600
+    hours_to = (shift_ends - origin) / 3600
+    derived_night = 2 * night_hours(hours_from, hours_to) >= np.maximum(hours_to - hours_from, 1e-9)
+    is_night = [bool(s['is_night']) if s.get('is_night') is not None else bool(derived)
+                for s, derived in zip(shifts, derived_night.tolist())]
+
+    available = ~unavailable_matrix(staff_ids, shift_starts, shift_ends, request.get('unavailability', []))
+    rows, cols = np.nonzero(available)
+    availability = {(staff_ids[n], *slots[m]): 1 for n, m in zip(rows.tolist(), cols.tolist())}
+
+    preferences = {}
+    for m, s in enumerate(shifts):
+        if s.get('preference'):
+            for n in np.nonzero(available[:, m])[0].tolist():
+                preferences[(staff_ids[n], *slots[m])] = s['preference']
+
+    translated = {k: v for k, v in request.items() if k not in ('staff', 'shifts', 'unavailability')}
+    translated.update({
+        'doctors': staff_ids,
+        'days': sorted({j for j, _ in slots}),
+        'shifts': shift_ids,
+        'slots': slots,
+        'requirements': {slot: s['required_count'] for slot, s in zip(slots, shifts)},
+        'availability': availability,
+        'shift_durations': dict(zip(shift_ids, durations.tolist())),
+        'max_weekly_hours': {s['id']: s['max_week_hours'] for s in staff},
+        'max_night_hours': {s['id']: s['max_night_hours'] for s in staff if s.get('max_night_hours') is not None},
+        'night_shifts': [k for k, night in zip(shift_ids, is_night) if night],
+        'preferences': preferences,
+        'slot_times': {slot: (start, end) for slot, start, end in zip(slots, hours_from.tolist(), hours_to.tolist())},
+        'format': 'intervals',
+    })
+    if request.get('fixed'):
+        # Published or worked shifts of a rolling horizon, given by shift_id as in the results
+        slot_of = dict(zip(shift_ids, slots))
+        translated['fixed'] = [(a['staff_id'], *slot_of[a['shift_id']]) for a in request['fixed']
+                               if a['shift_id'] in slot_of]
+    return translated
@@ -0,0 +1,85 @@
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from budget import SIZE_CLASSES, estimate_cells
+
+# Dispatch lanes, most urgent first: explicit 'priority' high/low (wins over size), small or mode=fast jobs,
+# everything else
+LANES = ('high', 'fast', 'normal', 'low')
+
+# Models up to this many available cells go to the fast lane (default: the 'small' size class)
+FAST_LANE_MAX_CELLS = int(os.getenv('FAST_LANE_MAX_CELLS', SIZE_CLASSES[0][1]))
+
+
+def parse_weights(spec: str) -> Dict[str, int]:
+    # 'high=8,fast=4' -> {'high': 8, 'fast': 4}; lanes not mentioned keep their default weight
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        lane, weight = item.split('=')
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane {lane!r} in LANE_WEIGHTS")
+        weights[lane] = max(1, int(weight))
+    return weights
+
+
+# Share of dispatches each lane gets while several lanes have waiting jobs
+LANE_WEIGHTS = {'high': 8, 'fast': 4, 'normal': 2, 'low': 1, **parse_weights(os.getenv('LANE_WEIGHTS', ''))}
+
+
+def job_lane(request: Optional[Dict[str, Any]]) -> str:
+    # Cheap estimate from the raw request: small or heuristic-only jobs never wait behind large solves
+    if request is None:
+        return 'normal'
+    # An explicit priority is honoured first, so a small low-priority job does not jump the queue
+    if request.get('priority') in ('high', 'low'):
+        return request['priority']
+    num_cells = estimate_cells(request)
+    if request.get('mode') == 'fast' or (num_cells is not None and num_cells <= FAST_LANE_MAX_CELLS):
+        return 'fast'
+    return 'normal'
+
+
+class LaneBacklog:
+    """
+    Jobs read from the stream but not yet dispatched, queued FIFO per lane.
+
+    pop() picks the lane by smooth weighted round robin among the lanes that have jobs, so a lane
+    with weight w gets w dispatches out of every sum-of-weights while all of them are busy and no
+    lane starves.
+    """
+
+    def __init__(self, weights: Dict[str, int] = LANE_WEIGHTS):
+        self.weights = weights
+        self.queues: Dict[str, OrderedDict] = {lane: OrderedDict() for lane in LANES}
+        self.credit = {lane: 0 for lane in LANES}
+
+    def add(self, job) -> None:
+        self.queues[job.lane][job.msg_id] = job
+
+    def remove(self, job) -> None:
+        del self.queues[job.lane][job.msg_id]
+
+    def pop(self, lanes: Iterable[str] = LANES):
+        # Oldest job of the next lane in weighted order, or None if all given lanes are empty
+        ready = [lane for lane in lanes if self.queues[lane]]
+        if not ready:
+            return None
+        for lane in ready:
+            self.credit[lane] += self.weights[lane]
+        lane = max(ready, key=lambda name: self.credit[name])
+        self.credit[lane] -= sum(self.weights[name] for name in ready)
+        return self.queues[lane].popitem(last=False)[1]
+
+    def has(self, lanes: Iterable[str] = LANES) -> bool:
+        return any(self.queues[lane] for lane in lanes)
+
+    def depths(self) -> Dict[str, int]:
+        return {lane: len(queue) for lane, queue in self.queues.items()}
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def __iter__(self) -> Iterator:
+        for queue in self.queues.values():
+            yield from list(queue.values())
@@ -4,14 +4,45 @@ import socket
 import uuid
 import time
 import logging
-from typing import Any, Dict, List, Tuple
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
 
 import redis
-from solver import generate_shift_schedule
+from budget import WEIGHTS, choose_budget
+from cache import build_cache, request_key
+from capture import build_capture
+from codec import JSON, read_request, request_type, result_fields, result_type
+from decompose import generate_decomposed_schedule
+from heuristic import HEURISTIC_TIME_LIMIT, greedy_schedule
+from horizon import ROLLING_WINDOW_DAYS, rolling_schedule
+from lanes import LaneBacklog, job_lane
+from solver import NoSolutionError
+from telemetry import observe_dispatch, observe_request, queue_lag, set_lane_depths, start_metrics_server
+from wire import decode_request
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Compare-and-set of the newest request ID of a scope: KEYS[1] latest key, ARGV[1] message ID, ARGV[2] TTL.
+# Returns the stored ID if it is newer than ARGV[1], otherwise stores ARGV[1] and returns nil.
+MARK_LATEST_SCRIPT = """
+local latest = redis.call('GET', KEYS[1])
+if latest then
+    local lms, lseq = string.match(latest, '(%d+)-(%d+)')
+    local ms, seq = string.match(ARGV[1], '(%d+)-(%d+)')
+    lms, lseq, ms, seq = tonumber(lms), tonumber(lseq), tonumber(ms), tonumber(seq)
+    if lms > ms or (lms == ms and lseq > seq) then
+        return latest
+    end
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return false
+"""
+
+
 class RedisStreamClient:
     def __init__(
         self,
@@ -23,10 +54,22 @@ class RedisStreamClient:
         self.request_stream = os.getenv('REDIS_REQUEST_STREAM', 'schedule:requests')
         self.result_stream = os.getenv('REDIS_RESULT_STREAM', 'schedule:results')
         self.group = os.getenv('REDIS_CONSUMER_GROUP', 'scheduler_service')
+        self.dead_letter_stream = os.getenv('REDIS_DEAD_LETTER_STREAM', 'schedule:dead-letter')
+        self.last_schedule_prefix = os.getenv('REDIS_LAST_SCHEDULE_PREFIX', 'schedule:last:')
+        # Newest request ID per schedule scope, shared by all consumers to detect superseded requests
+        self.latest_prefix = os.getenv('REDIS_LATEST_PREFIX', 'schedule:latest:')
+        self.latest_ttl = int(os.getenv('LATEST_TTL', 86400))
+        # Approximate cap on the results stream length (0 keeps everything)
+        self.result_maxlen = int(os.getenv('RESULT_STREAM_MAXLEN', 10000)) or None
+        # Pending entries idle for longer than this are taken over from crashed consumers
+        self.reclaim_idle_ms = int(os.getenv('RECLAIM_IDLE_MS', 300000))
+        self.max_deliveries = int(os.getenv('MAX_DELIVERIES', 3))
+        self._reclaim_cursor = '0-0'
 
         self.redis = redis.Redis(host=host, port=port, db=db)
-        # Consumer name: hostname + random suffix
-        self.consumer = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self._mark_latest = self.redis.register_script(MARK_LATEST_SCRIPT)
+        # Consumer name: CONSUMER_NAME, or hostname + random suffix
+        self.consumer = os.getenv('CONSUMER_NAME') or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
 
         # Create consumer group if it doesn't exist
         try:
@@ -50,23 +93,129 @@ class RedisStreamClient:
                 result.append((message_id, fields))
         return result
 
+    def reclaim_pending(self, count: int, exclude: Set[bytes] = frozenset()) -> List[Tuple[bytes, Dict[bytes, bytes]]]:
+        # Takes over entries left pending by dead consumers; poison messages go to the dead-letter stream
+        next_id, claimed, *_ = self.redis.xautoclaim(
+            self.request_stream, self.group, self.consumer,
+            min_idle_time=self.reclaim_idle_ms,
+            start_id=self._reclaim_cursor,
+            count=count,
+        )
+        self._reclaim_cursor = next_id
+        claimed = [(msg_id, fields) for msg_id, fields in claimed if msg_id not in exclude]
+        if not claimed:
+            return []
+
+        pipe = self.redis.pipeline(transaction=False)
+        for msg_id, _ in claimed:
+            pipe.xpending_range(self.request_stream, self.group, min=msg_id, max=msg_id, count=1)
+        deliveries = [entries[0]['times_delivered'] if entries else 0 for entries in pipe.execute()]
+
+        result = []
+        pipe = self.redis.pipeline(transaction=True)
+        for (msg_id, fields), times_delivered in zip(claimed, deliveries):
+            if fields and times_delivered <= self.max_deliveries:
+                result.append((msg_id, fields))
+                continue
+            logger.warning(f"Dead-lettering request {msg_id} after {times_delivered} deliveries")
+            pipe.xadd(self.dead_letter_stream, {
+                **(fields or {}),
+                'original_id': msg_id,
+                'error': f'delivered {times_delivered} times without being acknowledged',
+            })
+            pipe.xack(self.request_stream, self.group, msg_id)
+        if len(pipe):
+            pipe.execute()
+        return result
+
     def ack_request(self, message_id: bytes) -> None:
         # Acknowledge processing of a message
         self.redis.xack(self.request_stream, self.group, message_id)
 
-    def publish_result(self, result: Dict[str, Any]) -> None:
-        # Publish result payload as JSON
-        payload = json.dumps(result)
-        self.redis.xadd(self.result_stream, {'payload': payload})
+    def publish_result(self, result: Dict[str, Any], content_type: str = JSON) -> None:
+        # Publish a result payload in the content type the request asked for
+        fields = result_fields(result, content_type)
+        self.redis.xadd(self.result_stream, fields, maxlen=self.result_maxlen, approximate=True)
 
+    def publish_and_ack(self, message_id: bytes, result: Dict[str, Any], scope: Optional[str] = None,
+                        dead_letter: Optional[Dict[bytes, bytes]] = None, content_type: str = JSON) -> None:
+        # Publishes a final result, records it for its scope (or dead-letters the request) and acks, in one MULTI
+        pipe = self.redis.pipeline(transaction=True)
+        # Every result published here is the last one of its request; 'partial' alone also marks progress updates
+        fields = result_fields({**result, 'final': True}, content_type)
+        pipe.xadd(self.result_stream, fields, maxlen=self.result_maxlen, approximate=True)
+        if scope is not None:
+            pipe.set(self.last_schedule_prefix + scope, json.dumps(result['assignments']))
+        if dead_letter is not None:
+            pipe.xadd(self.dead_letter_stream, {**dead_letter, 'original_id': message_id, 'error': result['error']})
+        pipe.xack(self.request_stream, self.group, message_id)
+        pipe.execute()
 
-def process_request(payload: str) -> Dict[str, Any]:
-    # Parse the JSON envelope
-    request = json.loads(payload)
-    logger.info(f"Processing request {request.get('request_id')}")
+    def mark_latest(self, scope: str, message_id: bytes) -> Optional[bytes]:
+        # Records message_id as the newest request of its scope; returns the newer one if it is already superseded
+        # Atomic, so concurrent consumers never leave an older ID as the latest
+        return self._mark_latest(keys=[self.latest_prefix + scope], args=[message_id, self.latest_ttl])
 
-    start_time = time.perf_counter()
-    schedule = generate_shift_schedule(
+    def latest_requests(self, scopes: List[str]) -> List[Optional[bytes]]:
+        # Newest known request ID of each scope, in one round trip
+        if not scopes:
+            return []
+        return self.redis.mget([self.latest_prefix + scope for scope in scopes])
+
+    def load_last_assignments(self, scope: str) -> Optional[List[Dict[str, Any]]]:
+        # Last published assignments for a schedule scope, if any
+        raw = self.redis.get(self.last_schedule_prefix + scope)
+        return json.loads(raw) if raw is not None else None
+
+
+
+def stream_id(message_id: bytes) -> Tuple[int, int]:
+    # Stream entry IDs order by (milliseconds, sequence)
+    ms, seq = message_id.split(b'-')
+    return int(ms), int(seq)
+
+
+@dataclass
+class Job:
+    # A request message handed to the solver pool
+    msg_id: bytes
+    fields: Dict[bytes, bytes]
+    payload: bytes
+    request: Optional[Dict[str, Any]]
+    cache_key: Optional[str] = None
+    scope: Optional[str] = None
+    queue_lag: Optional[float] = None
+    cancel: Any = None   # Manager Event, set when a newer request of the same scope arrives
+    superseded_by: Optional[bytes] = None
+    lane: str = 'normal'
+    on_fast_pool: bool = False
+    requeued: bool = False   # handed back to the group during shutdown; its result is dropped
+    content_type: str = JSON   # of the payload
+    accept: str = JSON   # of the results
+    previous: Optional[List[Dict[str, Any]]] = None   # warm-start schedule the job was solved from
+
+
+def schedule_scope(request: Dict[str, Any]) -> Optional[str]:
+    # Requests for the same team and week share a scope; an explicit 'scope' field wins.
+    # Without either, requests are unrelated: week_start alone would merge different departments
+    if request.get('scope'):
+        return str(request['scope'])
+    if request.get('team') and request.get('week_start'):
+        return f"{request['team']}:{request['week_start']}"
+    return None
+
+
+def superseded_result(request_id: Optional[str], newer: Optional[bytes] = None) -> Dict[str, Any]:
+    # Final result of a request that was dropped in favour of a newer one of the same scope
+    result = {'request_id': request_id, 'status': 'superseded', 'assignments': []}
+    if newer is not None:
+        result['superseded_by'] = newer.decode()
+    return result
+
+
+def request_problem(request: Dict[str, Any]) -> Dict[str, Any]:
+    # Problem arguments of generate_shift_schedule for a decoded request
+    return dict(
         doctors=request['doctors'],
         days=request['days'],
         shifts=request['shifts'],
@@ -76,40 +225,378 @@ def process_request(payload: str) -> Dict[str, Any]:
         max_weekly_hours=request['max_weekly_hours'],
         min_rest_hours=request.get('min_rest_hours', 11),
         preferences=request.get('preferences'),
-        alpha=request.get('alpha', 1000),
-        beta=request.get('beta', 5),
-        gamma=request.get('gamma', 1),
+        slots=request.get('slots'),
+        night_shifts=request.get('night_shifts'),
+        max_night_hours=request.get('max_night_hours'),
+        slot_times=request.get('slot_times'),
+        shift_starts=request.get('shift_starts'),
+        carry_hours=request.get('carry_hours'),
+        alpha=request.get('alpha', WEIGHTS['alpha']),
+        beta=request.get('beta', WEIGHTS['beta']),
+        gamma=request.get('gamma', WEIGHTS['gamma']),
     )
+
+
+def process_request(payload: Union[str, bytes], max_workers: int = 8,
+                    previous: Optional[List[Dict[str, Any]]] = None,
+                    publish: Optional[Callable[[Dict[str, Any]], None]] = None,
+                    cancel: Any = None, content_type: str = JSON) -> Dict[str, Any]:
+    # Parse the envelope (JSON or one of the binary content types)
+    decode_start = time.perf_counter()
+    request = decode_request(read_request(payload, content_type))
+    decode_time = time.perf_counter() - decode_start
+    logger.info(f"Processing request {request.get('request_id')}")
+    if cancel is not None and cancel.is_set():
+        return superseded_result(request.get('request_id'))
+
+    # Warm start from the previously published schedule of the same scope
+    hint = None
+    if previous is not None:
+        hint = [(a['staff_id'], a['day'], a['shift']) for a in previous]
+
+    # Time limit and worker count follow the number of available cells and the request deadline
+    num_cells = sum(1 for a in request['availability'].values() if a)
+    budget = choose_budget(num_cells, max_workers, request)
+    stats: Dict[str, Any] = {}
+
+    start_time = time.perf_counter()
+
+    # Progressive mode: publish improving incumbents as 'partial' results
+    def publish_partial(schedule, objective, bound):
+        assignments = [{'staff_id': i, 'day': j, 'shift': k} for i, j, k in schedule]
+        publish({
+            'request_id': request.get('request_id'),
+            'status': 'partial',
+            'assignments': assignments,
+            'metrics': {
+                'objective': objective,
+                'best_bound': bound,
+                'elapsed': time.perf_counter() - start_time,
+                'num_assignments': len(assignments),
+            }
+        })
+
+    # Rolling horizon: only stale windows are solved, so incumbents of one window are not a schedule to publish
+    rolling = request.get('rolling', False)
+    on_solution = publish_partial if publish is not None and request.get('progressive') and not rolling else None
+
+    problem = request_problem(request)
+
+    def plan(solve, time_limit, stats, **options):
+        # The whole problem in one go, or window by window with the published schedule around it
+        if not rolling:
+            return solve(**problem, time_limit=time_limit, stats=stats, **options)
+        return rolling_schedule(
+            solve, **problem,
+            fixed=request.get('fixed', hint),
+            frozen_until=request.get('frozen_until'),
+            window_days=request.get('window_days', ROLLING_WINDOW_DAYS),
+            changed_days=request.get('changed_days'),
+            time_limit=time_limit,
+            hints=solve is not greedy_schedule,
+            stats=stats,
+        )
+
+    status = 'success'
+    fallback = False
+    if request.get('mode') == 'fast':
+        # Greedy schedule with bounded local search, no CP-SAT
+        schedule = plan(greedy_schedule, min(budget['time_limit'], HEURISTIC_TIME_LIMIT), stats)
+    else:
+        cpsat = partial(
+            generate_decomposed_schedule,
+            symmetry_breaking=request.get('symmetry_breaking', True),
+            num_workers=budget['num_workers'],
+            partitions=request.get('partitions'),
+            decompose=request.get('decompose', True),
+            relative_gap=budget['relative_gap'],
+            absolute_gap=budget['absolute_gap'],
+            stall_seconds=budget['stall_seconds'],
+            log_search_progress=request.get('log_search_progress', False),
+            stability_weight=request.get('stability_weight', 0),
+            on_solution=on_solution,
+            progress_interval=request.get('progress_interval', 1.0),
+            progress_min_improvement=request.get('progress_min_improvement', 0.0),
+            cancel=cancel,
+            random_seed=budget['random_seed'],
+            deterministic=budget['deterministic'],
+        )
+        try:
+            # A rolling request hints each window with its own published cells instead
+            schedule = plan(cpsat, budget['time_limit'], stats, **({} if rolling else {'hint': hint}))
+        except NoSolutionError:
+            if cancel is not None and cancel.is_set():
+                return superseded_result(request.get('request_id'))
+            # Better a schedule with gaps than none: fall back to the heuristic and report it as partial
+            logger.warning(f"No CP-SAT solution for request {request.get('request_id')}, using the heuristic")
+            stats = {}
+            schedule = plan(greedy_schedule, HEURISTIC_TIME_LIMIT, stats)
+            status, fallback = 'partial', True
     solve_time = time.perf_counter() - start_time
+    # A newer request of the same scope arrived while solving; its result replaces this one
+    if stats.get('stop_reason') == 'cancelled':
+        return superseded_result(request.get('request_id'))
+    if stats.get('stop_reason') == 'time_limit' and budget['deadline_bound']:
+        stats['stop_reason'] = 'deadline'
 
-    # Flatten schedule into assignments
-    assignments = [
-        {'staff_id': i, 'day': j, 'shift': k}
-        for (i, j, k), val in schedule.items() if val
-    ]
+    # The schedule holds assigned cells only; they go straight into the payload
+    extract_start = time.perf_counter()
+    covered: Dict[Tuple, int] = {}
+    assignments = []
+    # Requests in the README format identify shifts by shift_id
+    with_shift_id = request.get('format') == 'intervals'
+    for i, j, k in schedule:
+        covered[(j, k)] = covered.get((j, k), 0) + 1
+        assignments.append({'staff_id': i, 'day': j, 'shift': k, 'shift_id': k} if with_shift_id
+                           else {'staff_id': i, 'day': j, 'shift': k})
+    extract_time = stats.get('extract_time', 0.0) + time.perf_counter() - extract_start
 
-    return {
+    undercoverage = sum(max(0, r - covered.get(slot, 0)) for slot, r in problem['requirements'].items())
+
+    result = {
         'request_id': request.get('request_id'),
-        'status': 'success',
+        'status': status,
         'assignments': assignments,
         'metrics': {
             'solve_time': solve_time,
             'num_assignments': len(assignments),
+            'undercoverage': undercoverage,
+            'fallback': fallback,
+            'cache_hit': False,
+            'warm_start': hint is not None,
+            'objective': stats.get('objective'),
+            'best_bound': stats.get('best_bound'),
+            'solver_status': stats.get('status'),
+            'stop_reason': stats.get('stop_reason'),
+            'num_components': stats.get('num_components', 1),
+            'num_windows': stats.get('num_windows'),
+            'windows_solved': stats.get('windows_solved'),
+            'budget': budget,
+            'phases': {
+                'decode': decode_time,
+                'heuristic': stats.get('heuristic_time'),
+                'build': stats.get('build_time'),
+                'solve': stats.get('solve_time'),
+                'extract': extract_time,
+            },
+            'num_variables': stats.get('num_variables'),
+            'num_constraints': stats.get('num_constraints'),
+            'num_branches': stats.get('num_branches'),
+            'num_conflicts': stats.get('num_conflicts'),
+            'num_incumbents': stats.get('num_incumbents'),
+        }
+    }
+    # Opt-in search log: written to SEARCH_LOG_DIR when it is set, otherwise returned with the result
+    if 'search_log' in stats:
+        log_dir = os.getenv('SEARCH_LOG_DIR')
+        if log_dir:
+            result['search_log_file'] = write_search_log(log_dir, request.get('request_id'), stats['search_log'])
+        else:
+            result['search_log'] = stats['search_log']
+    return result
+
+
+def write_search_log(log_dir: str, request_id: Optional[str], lines: List[str]) -> str:
+    path = os.path.join(log_dir, f"{request_id or uuid.uuid4().hex}.log")
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return path
+
+
+# Per-process client used by pool workers to publish partial results
+_worker_client: Optional[RedisStreamClient] = None
+
+
+def init_worker() -> None:
+    global _worker_client
+    _worker_client = RedisStreamClient()
+
+
+def run_job(payload: bytes, max_workers: int,
+            previous: Optional[List[Dict[str, Any]]] = None, cancel: Any = None,
+            content_type: str = JSON, accept: str = JSON) -> Dict[str, Any]:
+    # Pool entry point: process_request with partial results going straight to the results stream
+    publish = partial(_worker_client.publish_result, content_type=accept) if _worker_client is not None else None
+    return process_request(payload, max_workers, previous, publish, cancel, content_type)
+
+
+def lookup_cached(cache, request: Optional[Dict[str, Any]]) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    # Returns the cache key of the request and, on a hit, a ready result
+    if cache is None or request is None:
+        return None, None
+    # With a stability penalty or a rolling horizon the result also depends on the previously published schedule
+    if request.get('stability_weight') or request.get('rolling'):
+        return None, None
+    try:
+        key = request_key(decode_request(request))
+    except (TypeError, AttributeError, KeyError, ValueError):
+        # Malformed requests fail in process_request and are reported from there
+        return None, None
+
+    assignments = cache.get(key)
+    if assignments is None:
+        return key, None
+    return key, {
+        'request_id': request.get('request_id'),
+        'status': 'success',
+        'assignments': assignments,
+        'metrics': {
+            'solve_time': 0.0,
+            'num_assignments': len(assignments),
+            'cache_hit': True,
+            'warm_start': False,
         }
     }
 
 
+# Results cut short by a time limit or deadline are not reused: the cache key ignores the budget
+CACHEABLE_STOP_REASONS = ('optimal', 'gap_limit')
+
+
+def cacheable(result: Dict[str, Any]) -> bool:
+    return (result['status'] == 'success'
+            and (result.get('metrics') or {}).get('stop_reason') in CACHEABLE_STOP_REASONS)
+
+
+def publish_outcome(client: RedisStreamClient, job: Job, future: Future, cache=None, capture=None) -> None:
+    # Publish the result (or error) of a finished job and ack its message
+    start = time.perf_counter()
+    try:
+        result = future.result()
+    except Exception as e:
+        logger.exception(f"Error processing request {job.msg_id}: {e}")
+        result = {
+            'request_id': (job.request or {}).get('request_id'),
+            'status': 'error',
+            'error': str(e),
+        }
+        client.publish_and_ack(job.msg_id, result, dead_letter=job.fields, content_type=job.accept)
+    else:
+        if result['status'] == 'superseded':
+            # Not recorded for the scope: the newer request's schedule is the one to warm start from
+            result = superseded_result(result.get('request_id'), job.superseded_by)
+            start = time.perf_counter()
+            client.publish_and_ack(job.msg_id, result, content_type=job.accept)
+        else:
+            # Heuristic fallbacks are not cached so the next identical request gets another CP-SAT attempt
+            if cache is not None and job.cache_key is not None and cacheable(result):
+                cache.put(job.cache_key, result['assignments'])
+            start = time.perf_counter()
+            client.publish_and_ack(job.msg_id, result, scope=job.scope, content_type=job.accept)
+    observe_request(job.msg_id, result, job.queue_lag, time.perf_counter() - start)
+    if capture is not None and result['status'] != 'superseded':
+        capture.write(job.msg_id, job.fields, job.previous, result)
+
+
+def publish_superseded(client: RedisStreamClient, job: Job, newer: bytes) -> None:
+    # Acks a request that a newer one of the same scope replaces, without solving it
+    result = superseded_result((job.request or {}).get('request_id'), newer)
+    start = time.perf_counter()
+    client.publish_and_ack(job.msg_id, result, content_type=job.accept)
+    observe_request(job.msg_id, result, job.queue_lag, time.perf_counter() - start)
+
+
+def cancel_superseded(client: RedisStreamClient, jobs: List[Job]) -> None:
+    # Stops solves whose scope got a newer request, possibly on another consumer
+    scoped = [job for job in jobs if job.scope is not None and job.superseded_by is None]
+    for job, latest in zip(scoped, client.latest_requests([job.scope for job in scoped])):
+        if latest is not None and stream_id(latest) > stream_id(job.msg_id):
+            logger.info(f"Cancelling request {job.msg_id}: superseded by {latest}")
+            job.superseded_by = latest
+            job.cancel.set()
+
+
+def fast_busy(in_flight: Dict[Future, Job]) -> int:
+    return sum(1 for job in in_flight.values() if job.on_fast_pool)
+
+
+def dispatch(client: RedisStreamClient, job: Job, pool: ProcessPoolExecutor, max_workers: int, manager,
+             warm_start: bool, in_flight: Dict[Future, Job], on_fast_pool: bool = False) -> None:
+    # Submits a backlog job to a solver pool, unless another consumer has read a newer one of its scope
+    latest = client.latest_requests([job.scope])[0] if job.scope is not None else None
+    if latest is not None and stream_id(latest) > stream_id(job.msg_id):
+        publish_superseded(client, job, latest)
+        return
+
+    previous = None
+    if job.scope is not None and job.request.get('warm_start', warm_start):
+        previous = client.load_last_assignments(job.scope)
+    job.queue_lag = queue_lag(job.msg_id)
+    observe_dispatch(job.lane, job.queue_lag)
+    job.cancel = manager.Event()
+    job.on_fast_pool = on_fast_pool
+    job.previous = previous
+    future = pool.submit(run_job, job.payload, max_workers, previous, job.cancel, job.content_type, job.accept)
+    in_flight[future] = job
+
+
+def solver_budget() -> Tuple[int, int, int]:
+    # Split the CPUs available to the service across concurrent solves, after one CPU per single-worker
+    # fast-lane solver, so that the host never runs more CP-SAT threads than CPUS
+    cpus = int(os.getenv('CPUS', os.cpu_count() or 1))
+    jobs = max(1, int(os.getenv('SOLVE_WORKERS', 1)))
+    fast_workers = max(0, int(os.getenv('FAST_LANE_WORKERS', 1)))
+    return jobs, fast_workers, max(1, (cpus - fast_workers) // jobs)
+
+
 def main():
     # Initialize Redis client using environment configuration
     client = RedisStreamClient()
-    logger.info("Scheduler service started, waiting for requests...")
+    cache = build_cache(client.redis)
+    capture = build_capture()
+    start_metrics_server()
+    jobs, fast_workers, max_workers = solver_budget()
+    logger.info(f"Scheduler service started ({jobs} concurrent solves x up to {max_workers} CP-SAT workers), "
+                f"waiting for requests...")
+
+    block_ms = int(os.getenv('READ_BLOCK_MS', 5000))
+    read_count = int(os.getenv('READ_COUNT', 10))
+    # Requests read ahead of free workers, so that bursts for one scope coalesce before they are solved
+    read_ahead = int(os.getenv('READ_AHEAD', 4 * jobs))
+    reclaim_interval = float(os.getenv('RECLAIM_INTERVAL', 30))
+    next_reclaim = 0.0
+    pool = ProcessPoolExecutor(max_workers=jobs, initializer=init_worker)
+    # Extra single-worker solvers reserved for the fast lane, so small jobs never queue behind large ones
+    fast_pool = ProcessPoolExecutor(max_workers=fast_workers, initializer=init_worker) if fast_workers else None
+    # Cancel events have to reach pool workers and the component pools they start
+    manager = multiprocessing.Manager()
+    warm_start = os.getenv('WARM_START', '0') == '1'
+    in_flight: Dict[Future, Job] = {}
+    backlog = LaneBacklog()   # read but not yet dispatched
 
     while True:
         try:
-            messages = client.read_requests(
-                block_ms=int(os.getenv('READ_BLOCK_MS', 5000)),
-                count=int(os.getenv('READ_COUNT', 10))
-            )
+            # Publish and ack jobs in completion order
+            done = [f for f in in_flight if f.done()]
+            for future in done:
+                publish_outcome(client, in_flight.pop(future), future, cache, capture)
+            cancel_superseded(client, list(in_flight.values()))
+
+            # Fast-lane workers only take small jobs; the main pool serves all lanes by weight
+            while fast_pool is not None and fast_busy(in_flight) < fast_workers and backlog.has(('fast',)):
+                dispatch(client, backlog.pop(('fast',)), fast_pool, 1, manager, warm_start, in_flight,
+                         on_fast_pool=True)
+            while len(in_flight) - fast_busy(in_flight) < jobs and backlog:
+                dispatch(client, backlog.pop(), pool, max_workers, manager, warm_start, in_flight)
+            set_lane_depths(backlog.depths())
+
+            # Only pull as many messages as there is room for ahead of the workers
+            room = jobs + fast_workers + read_ahead - len(in_flight) - len(backlog)
+            if room <= 0:
+                wait(in_flight, timeout=1.0, return_when=FIRST_COMPLETED)
+                continue
+
+            messages = []
+            if time.monotonic() >= next_reclaim:
+                pending_ids = {job.msg_id for job in in_flight.values()} | {job.msg_id for job in backlog}
+                messages = client.reclaim_pending(min(read_count, room), exclude=pending_ids)
+                next_reclaim = time.monotonic() + reclaim_interval
+            if not messages:
+                messages = client.read_requests(
+                    # Don't block on Redis while finished jobs may be waiting to be published
+                    block_ms=100 if in_flight or backlog else block_ms,
+                    count=min(read_count, room)
+                )
             if not messages:
                 continue
 
@@ -119,19 +606,41 @@ def main():
                     client.ack_request(msg_id)
                     continue
 
+                content_type = request_type(fields)
                 try:
-                    result = process_request(payload.decode('utf-8'))
-                    client.publish_result(result)
-                except Exception as e:
-                    logger.exception(f"Error processing request {msg_id}: {e}")
-                    error_payload = json.loads(payload)
-                    client.publish_result({
-                        'request_id': error_payload.get('request_id'),
-                        'status': 'error',
-                        'error': str(e),
-                    })
-                finally:
-                    client.ack_request(msg_id)
+                    request = read_request(payload, content_type)
+                except ValueError:
+                    # Malformed requests fail in process_request and are reported from there
+                    request = None
+                job = Job(msg_id, fields, payload, request, queue_lag=queue_lag(msg_id),
+                          content_type=content_type, accept=result_type(fields))
+                if request is not None:
+                    job.scope = schedule_scope(request)
+
+                # Only the newest request of a scope is solved
+                if job.scope is not None:
+                    newer = client.mark_latest(job.scope, msg_id)
+                    if newer is not None:
+                        publish_superseded(client, job, newer)
+                        continue
+                    for older in [j for j in backlog if j.scope == job.scope]:
+                        backlog.remove(older)
+                        publish_superseded(client, older, msg_id)
+                    for running in in_flight.values():
+                        if running.scope == job.scope and running.superseded_by is None:
+                            logger.info(f"Cancelling request {running.msg_id}: superseded by {msg_id}")
+                            running.superseded_by = msg_id
+                            running.cancel.set()
+
+                job.cache_key, cached = lookup_cached(cache, request)
+                if cached is not None:
+                    start = time.perf_counter()
+                    client.publish_and_ack(msg_id, cached, scope=job.scope, content_type=job.accept)
+                    observe_request(msg_id, cached, job.queue_lag, time.perf_counter() - start)
+                    continue
+
+                job.lane = job_lane(request)
+                backlog.add(job)
 
         except redis.exceptions.RedisError as e:
             logger.exception(f"Redis error: {e}")
@@ -140,5 +649,14 @@ def main():
             logger.info("Shutting down scheduler service.")
             break
 
+    pool.shutdown(wait=True, cancel_futures=True)
+    if fast_pool is not None:
+        fast_pool.shutdown(wait=True, cancel_futures=True)
+    manager.shutdown()
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    if os.getenv('SERVICE_MODE', 'sync') == 'async':
+        from async_service import main as async_main
+        async_main()
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,157 @@
+import argparse
+import cProfile
+import io
+import itertools
+import json
+import logging
+import os
+import pstats
+import time
+from typing import Any, Dict, List, Optional
+
+from capture import captured_payload, read_captures
+from codec import read_request, request_fields
+from main import process_request, request_problem
+from solver import build_model
+from wire import decode_request
+
+logger = logging.getLogger('replay')
+
+# Captured solver parameters a replay reuses unless overridden: budget key -> request field
+REPLAYED_PARAMETERS = {
+    'time_limit': 'time_limit',
+    'num_workers': 'num_workers',
+    'random_seed': 'seed',
+    'deterministic': 'deterministic',
+    'relative_gap': 'relative_gap',
+    'absolute_gap': 'absolute_gap',
+    'stall_seconds': 'stall_seconds',
+}
+
+
+def replay_payload(record: Dict[str, Any], setting: Dict[str, Any]):
+    # The captured payload, re-encoded with the captured (or overridden) solver parameters pinned
+    content_type = record['content_type']
+    request = read_request(captured_payload(record), content_type)
+    request = {k: v for k, v in request.items() if k not in ('deadline', 'progressive')}
+    for name, field in REPLAYED_PARAMETERS.items():
+        if setting.get(name) is not None:
+            request[field] = setting[name]
+    return request_fields(request, content_type)['payload']
+
+
+def dump_model(record: Dict[str, Any], directory: str) -> str:
+    # CpModel of the captured request as text proto; the heuristic hint is left out
+    request = decode_request(read_request(captured_payload(record), record['content_type']))
+    hint = None
+    if record.get('previous'):
+        hint = [(a['staff_id'], a['day'], a['shift']) for a in record['previous']]
+    model, _ = build_model(**request_problem(request), hint=hint,
+                           stability_weight=request.get('stability_weight', 0),
+                           symmetry_breaking=request.get('symmetry_breaking', True))
+    path = os.path.join(directory, f"{record.get('request_id') or record['message_id']}.pbtxt")
+    model.ExportToFile(path)
+    return path
+
+
+def replay(record: Dict[str, Any], setting: Dict[str, Any], profile_path: Optional[str] = None) -> Dict[str, Any]:
+    payload = replay_payload(record, setting)
+    max_workers = setting.get('num_workers') or 8
+    args = (payload, max_workers, record.get('previous'))
+    kwargs = {'content_type': record['content_type']}
+    profiler = cProfile.Profile() if profile_path is not None else None
+    start = time.perf_counter()
+    try:
+        if profiler is None:
+            result = process_request(*args, **kwargs)
+        else:
+            result = profiler.runcall(process_request, *args, **kwargs)
+    except Exception as e:
+        logger.exception(f"Replay of {record['message_id']} failed: {e}")
+        result = {'status': 'error', 'error': str(e)}
+    wall = time.perf_counter() - start
+    if profiler is not None:
+        profiler.dump_stats(profile_path)
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(15)
+        logger.info(f"Profile written to {profile_path}\n{summary.getvalue()}")
+
+    metrics = result.get('metrics', {})
+    captured = record.get('metrics') or {}
+    return {
+        'request_id': record.get('request_id'),
+        'message_id': record['message_id'],
+        'setting': setting,
+        'wall_s': wall,
+        'status': result['status'],
+        'error': result.get('error'),
+        'objective': metrics.get('objective'),
+        'best_bound': metrics.get('best_bound'),
+        'solver_status': metrics.get('solver_status'),
+        'stop_reason': metrics.get('stop_reason'),
+        'solve_time': metrics.get('solve_time'),
+        'num_branches': metrics.get('num_branches'),
+        'phases': metrics.get('phases'),
+        'captured': {
+            'status': record.get('status'),
+            'objective': captured.get('objective'),
+            'best_bound': captured.get('best_bound'),
+            'stop_reason': captured.get('stop_reason'),
+            'solve_time': captured.get('solve_time'),
+        },
+    }
+
+
+def settings_for(record: Dict[str, Any], args: argparse.Namespace) -> List[Dict[str, Any]]:
+    # Captured parameters, with every combination of the overrides given on the command line
+    captured = {name: (record.get('parameters') or {}).get(name) for name in REPLAYED_PARAMETERS}
+    overrides = {
+        'num_workers': args.workers,
+        'random_seed': args.seeds,
+        'time_limit': args.time_limit,
+        'deterministic': [args.deterministic == 'on'] if args.deterministic else None,
+    }
+    axes = {name: values for name, values in overrides.items() if values}
+    return [{**captured, **dict(zip(axes, combo))} for combo in itertools.product(*axes.values())]
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python replay.py', description='Replay captured scheduler requests')
+    parser.add_argument('captures', nargs='+', help='capture files (CAPTURE_PATH and its rotated .gz files)')
+    parser.add_argument('--request-id', nargs='+', help='only these request IDs (default: all)')
+    parser.add_argument('--limit', type=int, help='only the last N matching requests')
+    parser.add_argument('--workers', type=int, nargs='+', help='CP-SAT worker counts to compare')
+    parser.add_argument('--seeds', type=int, nargs='+', help='CP-SAT seeds to compare')
+    parser.add_argument('--time-limit', type=float, nargs='+', help='time limits to compare, seconds')
+    parser.add_argument('--deterministic', choices=['on', 'off'], help='force deterministic search on or off')
+    parser.add_argument('--profile', metavar='DIR', help='run under cProfile and write .prof files here')
+    parser.add_argument('--dump-model', metavar='DIR', help='write the CpModel of each request here (.pbtxt)')
+    parser.add_argument('--out', default='replay_results.json', help='JSON output file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    records = [r for r in read_captures(args.captures)
+               if args.request_id is None or r.get('request_id') in args.request_id]
+    if args.limit:
+        records = records[-args.limit:]
+
+    results = []
+    for record in records:
+        name = record.get('request_id') or record['message_id']
+        if args.dump_model:
+            logger.info(f"Model of {name} written to {dump_model(record, args.dump_model)}")
+        for n, setting in enumerate(settings_for(record, args)):
+            profile_path = os.path.join(args.profile, f"{name}-{n}.prof") if args.profile else None
+            row = replay(record, setting, profile_path)
+            logger.info(f"{name} {setting}: {row['status']} objective {row['objective']} "
+                        f"(captured {row['captured']['objective']}), solve {row['solve_time']} s "
+                        f"(captured {row['captured']['solve_time']}), stop {row['stop_reason']}")
+            results.append(row)
+
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2, default=str)
+    logger.info(f"Wrote {len(results)} replays to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
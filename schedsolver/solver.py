@@ -1,5 +1,189 @@
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
 from ortools.sat.python import cp_model
 
+# Start hour of named shift types for requests that carry no shift times
+DEFAULT_SHIFT_STARTS = {'morning': 8, 'evening': 16}
+
+# Lines of CP-SAT search log kept per solve when logging is requested (the oldest are dropped)
+SEARCH_LOG_LINES = int(os.getenv('SEARCH_LOG_LINES', 2000))
+
+
+def _cell_index(x):
+    # Cells of the assignment variables and the variables' positions in a solution vector
+    cells = list(x)
+    indices = np.fromiter((var.Index() for var in x.values()), dtype=np.int64, count=len(cells))
+    return cells, indices
+
+
+def _assigned(solution, cells, indices):
+    # Cells set to 1 in a CP-SAT solution vector: one gather instead of a Value() call per cell
+    values = np.asarray(solution, dtype=np.int64)[indices]
+    return [cells[n] for n in np.flatnonzero(values).tolist()]
+
+
+class IncumbentCallback(cp_model.CpSolverSolutionCallback):
+    """
+    Tracks incumbents and reports improving ones to on_solution(assigned cells, objective, bound).
+
+    The first solution is always reported; later ones only if at least min_interval seconds
+    have passed since the last report and the objective improved by min_improvement (relative).
+    """
+
+    def __init__(self, cells, indices, on_solution=None, min_interval=1.0, min_improvement=0.0):
+        super().__init__()
+        self.cells = cells
+        self.indices = indices
+        self.on_solution = on_solution
+        self.min_interval = min_interval
+        self.min_improvement = min_improvement
+        self.last_time = None
+        self.last_objective = None
+        self.num_incumbents = 0
+        self.last_improvement = None   # time.monotonic() of the latest incumbent
+
+    def on_solution_callback(self):
+        self.num_incumbents += 1
+        self.last_improvement = time.monotonic()
+        if self.on_solution is None:
+            return
+        objective = self.ObjectiveValue()
+        now = self.WallTime()
+        if self.last_objective is not None:
+            if now - self.last_time < self.min_interval:
+                return
+            if self.last_objective - objective < self.min_improvement * max(1.0, abs(self.last_objective)):
+                return
+        self.last_time, self.last_objective = now, objective
+        self.on_solution(_assigned(self.Response().solution, self.cells, self.indices),
+                         objective, self.BestObjectiveBound())
+
+
+def _stop_when_stalled(solver, callback, stall_seconds, done, stalled):
+    # Stops the search once no incumbent has been found for stall_seconds
+    while not done.wait(min(0.1, stall_seconds)):
+        last = callback.last_improvement
+        if last is not None and time.monotonic() - last >= stall_seconds:
+            stalled.set()
+            solver.StopSearch()
+            return
+
+
+def _stop_when_cancelled(solver, cancel, done, cancelled):
+    # Stops the search once cancel (anything with is_set(), e.g. a Manager Event) is set
+    while not done.wait(0.1):
+        if cancel.is_set():
+            cancelled.set()
+            solver.StopSearch()
+            return
+
+
+class NoSolutionError(ValueError):
+    """CP-SAT stopped without any feasible schedule."""
+
+
+def slot_intervals(slots, shift_durations, slot_times=None, shift_starts=None):
+    """
+    Start and end of every slot in hours on a common axis.
+
+    Args:
+        slots: List of (day, shift) slots.
+        shift_durations: Dict shift -> duration t_k (hours).
+        slot_times: Optional dict (day, shift) -> (start, end) in hours, used as given.
+        shift_starts: Optional dict shift -> start hour within its day; defaults to DEFAULT_SHIFT_STARTS.
+
+    Returns:
+        Dict (day, shift) -> (start, end) for the slots whose times are known.
+    """
+    if slot_times is not None:
+        return {slot: tuple(slot_times[slot]) for slot in slots if slot in slot_times}
+    starts = DEFAULT_SHIFT_STARTS if shift_starts is None else shift_starts
+    intervals = {}
+    for (j, k) in slots:
+        if k in starts:
+            begin = 24 * j + starts[k]
+            intervals[(j, k)] = (begin, begin + shift_durations[k])
+    return intervals
+
+
+def conflict_cliques(intervals, min_rest_hours):
+    """
+    Maximal groups of slots no doctor may combine: overlapping, or less than min_rest_hours apart.
+
+    Two slots conflict iff their intervals extended by min_rest_hours overlap, so the conflict graph
+    is an interval graph and its maximal cliques are the sets of extended intervals active right
+    before an end point that follows a start point. One sweep over the sorted end points finds them.
+
+    Args:
+        intervals: Dict slot -> (start, end) in hours.
+        min_rest_hours: Minimum rest between two shifts of the same doctor.
+
+    Returns:
+        List of cliques (lists of slots) with at least two slots each.
+    """
+    events = []
+    for slot, (begin, end) in intervals.items():
+        events.append((begin, 1, slot))
+        events.append((end + min_rest_hours, 0, slot))
+    # Half-open intervals: at equal times ends come before starts
+    events.sort(key=lambda e: (e[0], e[1]))
+
+    cliques = []
+    active = {}
+    grown = False
+    for _, is_start, slot in events:
+        if is_start:
+            active[slot] = None
+            grown = True
+            continue
+        if grown and len(active) > 1:
+            cliques.append(list(active))
+        grown = False
+        del active[slot]
+    return cliques
+
+
+def average_hours(doctors, slots, requirements, shift_durations, carry_hours=None):
+    # Fairness target H_avg: required hours of the slots plus hours carried in, per doctor (integer division)
+    H_sum = sum(requirements[(j, k)] * shift_durations[k] for (j, k) in slots)
+    return (H_sum + sum((carry_hours or {}).get(i, 0) for i in doctors)) // len(doctors)
+
+
+def doctor_classes(doctors, by_doctor, max_weekly_hours, max_night_hours=None, preferences=None, carry_hours=None):
+    """
+    Groups interchangeable doctors: same available slots, hour limits, carried hours and preference weights.
+
+    Args:
+        doctors: List of doctor IDs.
+        by_doctor: Dict doc -> feasible (doc, day, shift) cells.
+        max_weekly_hours: Dict doc -> max hours.
+        max_night_hours: Optional dict doc -> max night hours.
+        preferences: Optional dict (doc, day, shift) -> preference weight.
+        carry_hours: Optional dict doc -> hours carried into the fairness term.
+
+    Returns:
+        List of classes (lists of doctors, in input order) with at least two doctors each.
+    """
+    weights = {}
+    for (i, j, k), w in (preferences or {}).items():
+        if w:
+            weights.setdefault(i, []).append(((j, k), w))
+    classes = {}
+    for i in doctors:
+        signature = (
+            frozenset((j, k) for _, j, k in by_doctor[i]),
+            max_weekly_hours[i],
+            (max_night_hours or {}).get(i),
+            frozenset(weights.get(i, ())),
+            (carry_hours or {}).get(i, 0),
+        )
+        classes.setdefault(signature, []).append(i)
+    return [group for group in classes.values() if len(group) > 1]
+
 
 def generate_shift_schedule(doctors, days, shifts,
                             requirements,
@@ -10,7 +194,31 @@ def generate_shift_schedule(doctors, days, shifts,
                             preferences=None,
                             alpha=1000,
                             beta=5,
-                            gamma=1):
+                            gamma=1,
+                            num_workers=8,
+                            time_limit=60,
+                            relative_gap=0,
+                            absolute_gap=0,
+                            stall_seconds=0,
+                            log_search_progress=False,
+                            stats=None,
+                            hint=None,
+                            stability_weight=0,
+                            on_solution=None,
+                            progress_interval=1.0,
+                            progress_min_improvement=0.0,
+                            slots=None,
+                            h_avg=None,
+                            night_shifts=None,
+                            max_night_hours=None,
+                            slot_times=None,
+                            shift_starts=None,
+                            symmetry_breaking=True,
+                            initial=None,
+                            cancel=None,
+                            carry_hours=None,
+                            random_seed=None,
+                            deterministic=False):
     """
     Generates an optimized weekly shift schedule based on the mathematical model (Formulas 8.1–8.6).
 
@@ -22,95 +230,300 @@ def generate_shift_schedule(doctors, days, shifts,
         availability: Dict (doc, day, shift) -> binary a_{ijk} availability.
         shift_durations: Dict shift -> duration t_k (hours).
         max_weekly_hours: Dict doc -> max hours h_i^max.
-        min_rest_hours: Minimum rest between any two shifts (hours).
+        min_rest_hours: Minimum rest between any two shifts of a doctor (hours); overlapping shifts
+            are always exclusive.
         preferences: Optional dict (doc, day, shift) -> preference weight p_{ijk}.
         alpha: Penalty weight for undercoverage (>=1000).
         beta: Weight for workload fairness term (1–10).
         gamma: Weight for preference term (1–5).
+        num_workers: CP-SAT search workers for this solve.
+        time_limit: Solve time limit (seconds).
+        relative_gap: Stop once (objective - bound) / objective drops below this (0 disables it).
+        absolute_gap: Stop once objective - bound drops below this (0 disables it).
+        stall_seconds: Stop when no better solution was found for this long (0 disables it).
+        log_search_progress: Enable CP-SAT search logging; the last SEARCH_LOG_LINES lines go to
+            stats['search_log'] instead of stdout.
+        stats: Optional dict filled with solver status, objective, bound, incumbent count, stop reason,
+            model size, search counters and build/solve/extract times.
+        hint: Optional iterable of (doc, day, shift) cells of a previous schedule, used as a warm start.
+        stability_weight: Penalty per cell that differs from the hint (0 disables it).
+        on_solution: Optional callback(assigned cells, objective, bound) for intermediate solutions.
+        progress_interval: Minimum seconds between two on_solution calls.
+        progress_min_improvement: Minimum relative objective improvement between two on_solution calls.
+        slots: Optional list of (day, shift) slots to cover; defaults to all days x shifts.
+        h_avg: Optional average-hours target; defaults to the one derived from the covered slots.
+        night_shifts: Optional iterable of shifts that count as night shifts.
+        max_night_hours: Optional dict doc -> max night hours; doctors without an entry are not limited.
+        slot_times: Optional dict (day, shift) -> (start, end) in hours on a common axis.
+        shift_starts: Optional dict shift -> start hour within the day, used when slot_times is not given;
+            defaults to DEFAULT_SHIFT_STARTS. Slots without known times get no rest constraints.
+        symmetry_breaking: Order the hours of interchangeable doctors (ignored with a hint).
+        initial: Optional iterable of (doc, day, shift) cells of a heuristic schedule, used as a solution
+            hint without stability penalty when no hint is given.
+        cancel: Optional event (anything with is_set()); the search stops soon after it is set.
+        carry_hours: Optional dict doc -> hours worked before the planned days (e.g. earlier weeks of a
+            rolling horizon); they count toward the fairness term h_i and the default h_avg.
+        random_seed: Optional CP-SAT random seed.
+        deterministic: Reproducible search: workers interleave deterministically and time_limit is
+            CP-SAT deterministic time rather than wall time; stall_seconds is ignored.
+
+    Returns:
+        schedule: List of the assigned (doc, day, shift) cells, i.e. those with x_{ijk} = 1.
+    """
+    start = time.perf_counter()
+    model, x = build_model(doctors, days, shifts, requirements, availability, shift_durations,
+                           max_weekly_hours, min_rest_hours, preferences, alpha, beta, gamma,
+                           hint=hint, stability_weight=stability_weight, slots=slots, h_avg=h_avg,
+                           night_shifts=night_shifts, max_night_hours=max_night_hours,
+                           slot_times=slot_times, shift_starts=shift_starts,
+                           symmetry_breaking=symmetry_breaking, initial=initial, carry_hours=carry_hours)
+    if stats is not None:
+        proto = model.Proto()
+        stats['build_time'] = time.perf_counter() - start
+        stats['num_variables'] = len(proto.variables)
+        stats['num_constraints'] = len(proto.constraints)
+    return solve_model(model, x, num_workers=num_workers, time_limit=time_limit,
+                       relative_gap=relative_gap, absolute_gap=absolute_gap, stall_seconds=stall_seconds,
+                       log_search_progress=log_search_progress, stats=stats, on_solution=on_solution,
+                       progress_interval=progress_interval, progress_min_improvement=progress_min_improvement,
+                       cancel=cancel, random_seed=random_seed, deterministic=deterministic)
+
+
+def build_model(doctors, days, shifts,
+                requirements,
+                availability,
+                shift_durations,
+                max_weekly_hours,
+                min_rest_hours=11,
+                preferences=None,
+                alpha=1000,
+                beta=5,
+                gamma=1,
+                hint=None,
+                stability_weight=0,
+                slots=None,
+                h_avg=None,
+                night_shifts=None,
+                max_night_hours=None,
+                slot_times=None,
+                shift_starts=None,
+                symmetry_breaking=True,
+                initial=None,
+                carry_hours=None):
+    """
+    Builds the CP-SAT model (Formulas 8.1–8.6); see generate_shift_schedule for the arguments.
 
     Returns:
-        schedule: Dict (doc, day, shift) -> 0/1 assignment x_{ijk}.
+        model: The CpModel.
+        x: Dict (doc, day, shift) -> BoolVar x_{ijk} over the available cells.
     """
     model = cp_model.CpModel()
+    if slots is None:
+        slots = [(j, k) for j in days for k in shifts]
+
+    carry = carry_hours or {}
+    if h_avg is None:
+        # Average hours per doctor: H_sum = sum_{j,k} r_{jk} * t_k plus carried hours, integer division
+        H_avg = average_hours(doctors, slots, requirements, shift_durations, carry)
+    else:
+        H_avg = h_avg
 
-    # Precompute total required hours H_sum = sum_{j,k} r_{jk} * t_k
-    H_sum = sum(requirements[(j, k)] * shift_durations[k] for j in days for k in shifts)
-    # Average hours per doctor (integer division)
-    H_avg = H_sum // len(doctors)
+    # Sparse index of feasible cells: only (i, j, k) with a_{i,j,k} = 1 get a variable,
+    # which is equivalent to (8.3) x_{i,j,k} <= a_{i,j,k} without the dead variables
+    doctor_set, slot_set = set(doctors), set(slots)
+    cells = [
+        (i, j, k) for (i, j, k), a in availability.items()
+        if a and i in doctor_set and (j, k) in slot_set
+    ]
+    by_doctor = {i: [] for i in doctors}   # i -> feasible cells of doctor i
+    by_slot = {slot: [] for slot in slots}   # (j, k) -> feasible cells of slot (j, k)
+    for c in cells:
+        by_doctor[c[0]].append(c)
+        by_slot[(c[1], c[2])].append(c)
 
     # Variables
-    x = {}   # assignment x_{i,j,k}
-    for i in doctors:
-        for j in days:
-            for k in shifts:
-                x[(i, j, k)] = model.NewBoolVar(f'x_{i}_{j}_{k}')
+    x = {}   # assignment x_{i,j,k}, feasible cells only
+    for (i, j, k) in cells:
+        x[(i, j, k)] = model.NewBoolVar(f'x_{i}_{j}_{k}')
 
     u = {}   # undercoverage u_{j,k}
-    for j in days:
-        for k in shifts:
-            max_u = requirements.get((j, k), len(doctors))
-            u[(j, k)] = model.NewIntVar(0, max_u, f'u_{j}_{k}')
+    for (j, k) in slots:
+        max_u = requirements.get((j, k), len(doctors))
+        u[(j, k)] = model.NewIntVar(0, max_u, f'u_{j}_{k}')
 
     h = {}   # total hours h_i
     d = {}   # deviation from average d_i
     for i in doctors:
         h[i] = model.NewIntVar(0, max_weekly_hours[i], f'h_{i}')
-        # Domain of d_i must cover max deviation |h_i - H_avg|, up to H_avg
-        d[i] = model.NewIntVar(0, H_avg, f'd_{i}')
+        # Domain of d_i must cover max deviation |h_i - H_avg|, up to H_avg; carried hours c_i can push
+        # c_i + h_i further above it
+        max_d = max(H_avg, carry[i] + max_weekly_hours[i] - H_avg) if carry.get(i) else H_avg
+        d[i] = model.NewIntVar(0, max_d, f'd_{i}')
 
     # Constraints
     # (8.2) Coverage: sum_i x_{i,j,k} + u_{j,k} >= r_{jk}
-    for j in days:
-        for k in shifts:
-            req = requirements[(j, k)]
-            model.Add(sum(x[(i, j, k)] for i in doctors) + u[(j, k)] >= req)
-
-    # (8.3) Availability: x_{i,j,k} <= a_{i,j,k}
-    for i in doctors:
-        for j in days:
-            for k in shifts:
-                if availability.get((i, j, k), 0) == 0:
-                    model.Add(x[(i, j, k)] == 0)
+    for (j, k), slot_cells in by_slot.items():
+        req = requirements[(j, k)]
+        model.Add(sum(x[c] for c in slot_cells) + u[(j, k)] >= req)
 
     # (8.4) Weekly hours: h_i = sum_{j,k} t_k * x_{i,j,k}  and <= max
-    for i in doctors:
-        model.Add(h[i] == sum(shift_durations[k] * x[(i, j, k)] for j in days for k in shifts))
+    for i, doctor_cells in by_doctor.items():
+        model.Add(h[i] == sum(shift_durations[c[2]] * x[c] for c in doctor_cells))
         model.Add(h[i] <= max_weekly_hours[i])
 
-    # (8.5a) Rest constraints: simplified example
-    if 'evening' in shifts and 'morning' in shifts:
+    # Night hours: sum_{j, k night} t_k * x_{i,j,k} <= n_i^max
+    if night_shifts and max_night_hours:
+        night_set = set(night_shifts)
+        for i, doctor_cells in by_doctor.items():
+            night_cells = [c for c in doctor_cells if c[2] in night_set]
+            if i in max_night_hours and night_cells:
+                model.Add(sum(shift_durations[c[2]] * x[c] for c in night_cells) <= max_night_hours[i])
+
+    # (8.5a) Rest constraints: at most one shift per doctor in every group of mutually conflicting slots
+    intervals = slot_intervals(slots, shift_durations, slot_times, shift_starts)
+    for clique in conflict_cliques(intervals, min_rest_hours):
         for i in doctors:
-            for j in days[:-1]:
-                model.Add(x[(i, j, 'evening')] + x[(i, j+1, 'morning')] <= 1)
+            clique_vars = [x[(i, j, k)] for (j, k) in clique if (i, j, k) in x]
+            if len(clique_vars) > 1:
+                model.AddAtMostOne(clique_vars)
 
-    # (8.5b) Load deviation linearization
+    # (8.5b) Load deviation linearization, carried hours included
     for i in doctors:
-        model.Add(h[i] - H_avg <= d[i])
-        model.Add(H_avg - h[i] <= d[i])
+        model.Add(carry.get(i, 0) + h[i] - H_avg <= d[i])
+        model.Add(H_avg - carry.get(i, 0) - h[i] <= d[i])
+
+    # Symmetry breaking: doctors of one class are interchangeable, so any solution can be permuted
+    # into one where their hours are non-increasing. A hint names specific doctors, so keep it valid.
+    classes = []
+    if symmetry_breaking and hint is None:
+        classes = doctor_classes(doctors, by_doctor, max_weekly_hours, max_night_hours, preferences, carry)
+        for group in classes:
+            for a, b in zip(group, group[1:]):
+                model.Add(h[a] >= h[b])
 
     # Objective (8.6): alpha * sum u + beta * sum d - gamma * sum p*x
-    obj_terms = [alpha * u[(j, k)] for j in days for k in shifts] + [beta * d[i] for i in doctors]
+    obj_terms = [alpha * u[slot] for slot in slots] + [beta * d[i] for i in doctors]
     if preferences:
-        for i in doctors:
-            for j in days:
-                for k in shifts:
-                    w = preferences.get((i, j, k), 0)
-                    if w:
-                        obj_terms.append(-gamma * w * x[(i, j, k)])
+        for c, w in preferences.items():
+            if w and c in x:
+                obj_terms.append(-gamma * w * x[c])
+
+    # Warm start: previous assignment as solution hint, optionally penalising changes to it
+    if hint is not None:
+        previous = set(map(tuple, hint))
+        for c, var in x.items():
+            model.AddHint(var, c in previous)
+        if stability_weight:
+            obj_terms.extend(stability_weight * (1 - var) if c in previous else stability_weight * var
+                             for c, var in x.items())
+
+    # Heuristic start: hinted as is, except that interchangeable doctors swap schedules to match the ordering
+    if hint is None and initial is not None:
+        chosen = set(map(tuple, initial))
+        rename = {}
+        for group in classes:
+            worked = {i: sum(shift_durations[c[2]] for c in by_doctor[i] if c in chosen) for i in group}
+            rename.update(zip(sorted(group, key=lambda i: -worked[i]), group))
+        chosen = {(rename.get(i, i), j, k) for (i, j, k) in chosen}
+        for c, var in x.items():
+            model.AddHint(var, c in chosen)
 
     model.Minimize(sum(obj_terms))
+    return model, x
+
+
+def solve_model(model, x,
+                num_workers=8,
+                time_limit=60,
+                relative_gap=0,
+                absolute_gap=0,
+                stall_seconds=0,
+                log_search_progress=False,
+                stats=None,
+                on_solution=None,
+                progress_interval=1.0,
+                progress_min_improvement=0.0,
+                cancel=None,
+                random_seed=None,
+                deterministic=False):
+    """
+    Solves a model from build_model; see generate_shift_schedule for the arguments.
 
-    # Solve with diagnostic logs on infeasibility
+    Returns:
+        schedule: List of the assigned (doc, day, shift) cells, i.e. those with x_{ijk} = 1.
+    """
     solver = cp_model.CpSolver()
-    solver.parameters.max_time_in_seconds = 60
-    solver.parameters.num_search_workers = 8
-    solver.parameters.log_search_progress = True
+    solver.parameters.num_search_workers = num_workers
+    if random_seed is not None:
+        solver.parameters.random_seed = random_seed
+    if deterministic:
+        # Same model, seed, workers and limit give the same search, however fast the machine is
+        solver.parameters.interleave_search = True
+        solver.parameters.max_deterministic_time = time_limit
+        stall_seconds = 0
+    else:
+        solver.parameters.max_time_in_seconds = time_limit
+    # Search logs are opt-in and kept in a bounded buffer rather than written to stdout
+    search_log = None
+    if log_search_progress:
+        search_log = deque(maxlen=SEARCH_LOG_LINES)
+        solver.parameters.log_search_progress = True
+        solver.parameters.log_to_stdout = False
+        solver.log_callback = search_log.append
+    if relative_gap:
+        solver.parameters.relative_gap_limit = relative_gap
+    if absolute_gap:
+        solver.parameters.absolute_gap_limit = absolute_gap
+
+    cells, indices = _cell_index(x)
+    callback = IncumbentCallback(cells, indices, on_solution, progress_interval, progress_min_improvement)
+    done, stalled, cancelled = threading.Event(), threading.Event(), threading.Event()
+    watchdogs = []
+    if stall_seconds:
+        watchdogs.append(threading.Thread(target=_stop_when_stalled,
+                                          args=(solver, callback, stall_seconds, done, stalled), daemon=True))
+    if cancel is not None:
+        watchdogs.append(threading.Thread(target=_stop_when_cancelled,
+                                          args=(solver, cancel, done, cancelled), daemon=True))
+    for watchdog in watchdogs:
+        watchdog.start()
+    start = time.perf_counter()
+    try:
+        status = solver.Solve(model, callback)
+    finally:
+        done.set()
+        for watchdog in watchdogs:
+            watchdog.join()
+
+    if stats is not None:
+        stats['solve_time'] = time.perf_counter() - start
+        stats['status'] = solver.StatusName(status)
+        stats['num_incumbents'] = callback.num_incumbents
+        stats['num_branches'] = solver.NumBranches()
+        stats['num_conflicts'] = solver.NumConflicts()
+        if search_log is not None:
+            stats['search_log'] = list(search_log)
+        if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            stats['objective'] = solver.ObjectiveValue()
+            stats['best_bound'] = solver.BestObjectiveBound()
+        if cancelled.is_set():
+            stats['stop_reason'] = 'cancelled'
+        elif stalled.is_set():
+            stats['stop_reason'] = 'no_improvement'
+        elif status == cp_model.OPTIMAL:
+            stats['stop_reason'] = 'optimal' if solver.ObjectiveValue() == solver.BestObjectiveBound() else 'gap_limit'
+        elif status == cp_model.INFEASIBLE:
+            stats['stop_reason'] = 'infeasible'
+        else:
+            stats['stop_reason'] = 'time_limit'
 
-    status = solver.Solve(model)
     if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
         print('Solver status:', solver.StatusName(status))
-        raise ValueError('No feasible solution found! Consider relaxing constraints or checking input data.')
+        raise NoSolutionError('No feasible solution found! Consider relaxing constraints or checking input data.')
 
-    # Extract schedule
-    schedule = {(i, j, k): int(solver.Value(x[(i, j, k)])) for i in doctors for j in days for k in shifts}
+    # Extract the assigned cells from the solution vector in bulk
+    start = time.perf_counter()
+    schedule = _assigned(solver.ResponseProto().solution, cells, indices)
+    if stats is not None:
+        stats['extract_time'] = time.perf_counter() - start
     return schedule
@@ -0,0 +1,88 @@
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+logger = logging.getLogger('scheduler.requests')
+
+# Seconds, from sub-millisecond decodes to full-length solves
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (10, 100, 1000, 5000, 10000, 50000, 100000, 500000, 1000000)
+
+PHASE_SECONDS = Histogram('scheduler_phase_seconds', 'Time spent per request phase', ['phase'],
+                          buckets=TIME_BUCKETS)
+QUEUE_LAG_SECONDS = Histogram('scheduler_queue_lag_seconds',
+                              'Time between XADD of a request and the start of its solve', buckets=TIME_BUCKETS)
+MODEL_VARIABLES = Histogram('scheduler_model_variables', 'CP-SAT model variables per solve', buckets=SIZE_BUCKETS)
+MODEL_CONSTRAINTS = Histogram('scheduler_model_constraints', 'CP-SAT model constraints per solve',
+                              buckets=SIZE_BUCKETS)
+INCUMBENTS = Histogram('scheduler_incumbents', 'Solutions found per solve', buckets=(0, 1, 2, 5, 10, 20, 50, 100))
+REQUESTS = Counter('scheduler_requests_total', 'Processed requests', ['status'])
+SOLVER_STATUS = Counter('scheduler_solver_status_total', 'CP-SAT outcomes', ['status', 'stop_reason'])
+BRANCHES = Counter('scheduler_solver_branches_total', 'CP-SAT search branches')
+CONFLICTS = Counter('scheduler_solver_conflicts_total', 'CP-SAT search conflicts')
+CACHE_HITS = Counter('scheduler_cache_hits_total', 'Requests answered from the result cache')
+LANE_DEPTH = Gauge('scheduler_lane_depth', 'Requests read and waiting for a solver, per lane', ['lane'])
+LANE_WAIT_SECONDS = Histogram('scheduler_lane_wait_seconds', 'Time between XADD of a request and its dispatch',
+                              ['lane'], buckets=TIME_BUCKETS)
+
+
+def start_metrics_server() -> None:
+    # METRICS_PORT=0 disables the endpoint
+    port = int(os.getenv('METRICS_PORT', 9100))
+    if port:
+        start_http_server(port)
+        logger.info(f"Metrics endpoint listening on :{port}/metrics")
+
+
+def queue_lag(message_id: bytes, now: Optional[float] = None) -> float:
+    # Stream entry IDs start with the millisecond timestamp of the XADD
+    added_ms = int(message_id.split(b'-')[0])
+    return max(0.0, (time.time() if now is None else now) - added_ms / 1000)
+
+
+def set_lane_depths(depths: Dict[str, int]) -> None:
+    for lane, depth in depths.items():
+        LANE_DEPTH.labels(lane=lane).set(depth)
+
+
+def observe_dispatch(lane: str, wait: float) -> None:
+    LANE_WAIT_SECONDS.labels(lane=lane).observe(wait)
+
+
+def observe_request(message_id: bytes, result: Dict[str, Any], lag: Optional[float], publish_time: float) -> None:
+    # Records one finished request in the Prometheus metrics and as a structured log line
+    metrics = result.get('metrics', {})
+    status = result.get('status', 'unknown')
+    REQUESTS.labels(status=status).inc()
+    PHASE_SECONDS.labels(phase='publish').observe(publish_time)
+    if lag is not None:
+        QUEUE_LAG_SECONDS.observe(lag)
+    if metrics.get('cache_hit'):
+        CACHE_HITS.inc()
+
+    for phase, seconds in (metrics.get('phases') or {}).items():
+        if seconds is not None:
+            PHASE_SECONDS.labels(phase=phase).observe(seconds)
+    if metrics.get('num_variables') is not None:
+        MODEL_VARIABLES.observe(metrics['num_variables'])
+        MODEL_CONSTRAINTS.observe(metrics['num_constraints'])
+        INCUMBENTS.observe(metrics['num_incumbents'])
+        BRANCHES.inc(metrics['num_branches'])
+        CONFLICTS.inc(metrics['num_conflicts'])
+    if metrics.get('solver_status') is not None:
+        SOLVER_STATUS.labels(status=metrics['solver_status'], stop_reason=metrics.get('stop_reason')).inc()
+
+    logger.info(json.dumps({
+        'event': 'request_done',
+        'message_id': message_id.decode(),
+        'request_id': result.get('request_id'),
+        'status': status,
+        'queue_lag': lag,
+        'publish': publish_time,
+        'error': result.get('error'),
+        **metrics,
+    }, default=str))
@@ -0,0 +1,72 @@
+from typing import Any, Dict, List, Tuple
+
+from ingest import from_interval_request
+
+# JSON cannot key objects by (doc, day, shift) tuples, so on the wire these fields are lists of entries:
+#   requirements: [[day, shift, r], ...]
+#   availability: [[doc, day, shift], ...]            (available cells only)
+#   preferences:  [[doc, day, shift, weight], ...]
+#   slot_times:   [[day, shift, start, end], ...]         (hours on a common axis)
+#   fixed:        [[doc, day, shift], ...] or published assignments [{staff_id, day, shift}, ...]
+# Dicts keyed by tuples are accepted as-is for in-process callers.
+# Requests in the README format (staff / unavailability / shifts with timestamps) are translated by ingest.
+
+
+def _by_doctor(values: Dict, doctors: List) -> Dict:
+    # JSON object keys are strings even when doctor IDs are numbers
+    return {i: values[i] if i in values else values[str(i)] for i in doctors}
+
+
+def _cell(entry) -> Tuple:
+    if isinstance(entry, dict):
+        return entry['staff_id'], entry['day'], entry['shift']
+    return tuple(entry)
+
+
+def decode_request(request: Dict[str, Any]) -> Dict[str, Any]:
+    # Turns the wire encoding of a request into the tuple-keyed dicts generate_shift_schedule takes
+    if 'staff' in request:
+        return _decode_horizon(from_interval_request(request))
+    request = dict(request)
+    if isinstance(request.get('requirements'), list):
+        request['requirements'] = {(j, k): r for j, k, r in request['requirements']}
+    if isinstance(request.get('availability'), list):
+        request['availability'] = {(i, j, k): 1 for i, j, k in request['availability']}
+    if isinstance(request.get('preferences'), list):
+        request['preferences'] = {(i, j, k): w for i, j, k, w in request['preferences']}
+    if isinstance(request.get('max_weekly_hours'), dict):
+        request['max_weekly_hours'] = _by_doctor(request['max_weekly_hours'], request['doctors'])
+    if isinstance(request.get('max_night_hours'), dict):
+        night = request['max_night_hours']
+        request['max_night_hours'] = _by_doctor(night, [i for i in request['doctors'] if i in night or str(i) in night])
+    if isinstance(request.get('slot_times'), list):
+        request['slot_times'] = {(j, k): (start, end) for j, k, start, end in request['slot_times']}
+    if isinstance(request.get('slots'), list):
+        request['slots'] = [tuple(slot) for slot in request['slots']]
+    return _decode_horizon(request)
+
+
+def _decode_horizon(request: Dict[str, Any]) -> Dict[str, Any]:
+    # Rolling-horizon fields, shared by both request formats
+    if isinstance(request.get('carry_hours'), dict):
+        carry = request['carry_hours']
+        request['carry_hours'] = _by_doctor(carry, [i for i in request['doctors'] if i in carry or str(i) in carry])
+    if isinstance(request.get('fixed'), list):
+        request['fixed'] = [_cell(entry) for entry in request['fixed']]
+    return request
+
+
+def encode_request(problem: Dict[str, Any]) -> Dict[str, Any]:
+    # Inverse of decode_request: a JSON-serialisable request for a tuple-keyed problem
+    request = dict(problem)
+    request['requirements'] = [[j, k, r] for (j, k), r in problem['requirements'].items()]
+    request['availability'] = [list(c) for c, a in problem['availability'].items() if a]
+    if problem.get('preferences'):
+        request['preferences'] = [[*c, w] for c, w in problem['preferences'].items() if w]
+    if problem.get('slot_times'):
+        request['slot_times'] = [[*slot, *times] for slot, times in problem['slot_times'].items()]
+    if problem.get('slots'):
+        request['slots'] = [list(slot) for slot in problem['slots']]
+    if problem.get('fixed'):
+        request['fixed'] = [list(c) for c in problem['fixed']]
+    return request